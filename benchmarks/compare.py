@@ -0,0 +1,68 @@
+"""
+Compara dois arquivos de resultados de 'benchmarks.run'.
+Um cenário regride se a latência p50 aumentar mais que o limite ou se ele passar a executar mais consultas SQL.
+
+```
+python -m benchmarks.compare baseline.json results.json --threshold 0.15
+```
+"""
+
+import argparse
+import json
+import sys
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.10) -> list[dict]:
+    """Retorna uma linha por cenário presente nos dois resultados, indicando se houve regressão."""
+
+    rows = []
+    for name, result in current['results'].items():
+        before = baseline['results'].get(name)
+        if before is None:
+            continue
+
+        change = result['p50_ms'] / before['p50_ms'] - 1 if before['p50_ms'] else 0.0
+        more_queries = result['queries_per_op'] > before['queries_per_op']
+        rows.append({
+            'name': name,
+            'baseline_p50_ms': before['p50_ms'],
+            'p50_ms': result['p50_ms'],
+            'change': change,
+            'baseline_queries': before['queries_per_op'],
+            'queries': result['queries_per_op'],
+            'regression': change > threshold or more_queries,
+        })
+    return rows
+
+
+def print_comparison(rows: list[dict]) -> None:
+
+    for row in rows:
+        status = 'REGRESSÃO' if row['regression'] else 'ok'
+        print(
+            f'{row["name"]:<14} {row["baseline_p50_ms"]:8.2f} -> {row["p50_ms"]:8.2f} ms ({row["change"]:+7.1%})  '
+            f'consultas {row["baseline_queries"]:5.1f} -> {row["queries"]:5.1f}  {status}'
+        )
+
+
+def main() -> None:
+
+    parser = argparse.ArgumentParser(description = __doc__.split('\n\n')[0])
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--threshold', type = float, default = 0.10)
+    args = parser.parse_args()
+
+    with open(args.baseline, encoding = 'utf8') as f:
+        baseline = json.load(f)
+    with open(args.current, encoding = 'utf8') as f:
+        current = json.load(f)
+
+    rows = compare(baseline, current, args.threshold)
+    print_comparison(rows)
+    if any(row['regression'] for row in rows):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Gera um banco de dados sintético e reprodutível para os benchmarks.
+A mesma semente gera sempre os mesmos dados. Os likes seguem uma distribuição de Zipf,
+então poucos posts concentram a maior parte deles, como em um feed real.
+
+```
+python -m benchmarks.dataset instance/bench.sqlite --users 1000 --posts 100000 --likes 500000
+```
+"""
+
+import argparse
+import os
+import random
+import time
+from dataclasses import dataclass, asdict
+from itertools import accumulate
+
+from werkzeug.security import generate_password_hash
+
+from blog import create_app
+from blog.db import get_db, init_db
+from blog.models import User, Post, Reply, Like
+
+
+# Todos os usuários sintéticos têm esta senha, para que o login possa ser medido
+PASSWORD = 'bench'
+
+
+@dataclass
+class DatasetConfig:
+    users: int = 200
+    posts: int = 5000
+    replies: int = 10000
+    likes: int = 20000
+    # Expoente da distribuição de Zipf dos likes por post (0 distribui de forma uniforme)
+    skew: float = 1.1
+    seed: int = 42
+
+
+def _zipf_weights(count: int, skew: float) -> list[float]:
+    """Pesos acumulados em que o post de posição 'i' recebe likes proporcionais a 1 / i ** skew."""
+    return list(accumulate(1 / rank ** skew for rank in range(1, count + 1)))
+
+
+def _like_pairs(config: DatasetConfig, rng: random.Random) -> list[tuple[int, int]]:
+    """Sorteia pares (post_id, user_id) distintos, com os posts escolhidos pela distribuição de Zipf."""
+
+    total = min(config.likes, config.posts * config.users)
+    weights = _zipf_weights(config.posts, config.skew)
+    # A ordem de popularidade não acompanha o id, para que os posts populares fiquem espalhados pelo feed
+    ranking = list(range(1, config.posts + 1))
+    rng.shuffle(ranking)
+
+    pairs: set[tuple[int, int]] = set()
+    while len(pairs) < total:
+        missing = total - len(pairs)
+        posts = rng.choices(ranking, cum_weights = weights, k = missing)
+        pairs.update((post_id, rng.randint(1, config.users)) for post_id in posts)
+        if len(pairs) < total and config.skew > 0:
+            # Os posts mais populares podem esgotar os usuários; completa com posts uniformes
+            weights = None
+    return sorted(pairs)
+
+
+def generate(path: str, config: DatasetConfig) -> dict:
+    """
+    Cria o banco de dados em 'path' com os dados descritos por 'config'.
+    Retorna a configuração e o tempo gasto, para que os resultados registrem o dataset usado.
+    """
+
+    rng = random.Random(config.seed)
+    if os.path.exists(path):
+        os.remove(path)
+
+    app = create_app({'DATABASE': path, 'PASSWORD_HASH_WORKERS': 0})
+    start = time.perf_counter()
+
+    with app.app_context():
+        init_db()
+
+        # Um único hash para todos, senão gerar os usuários levaria minutos
+        password_hash = generate_password_hash(PASSWORD, app.config['PASSWORD_HASH_METHOD'])
+        User.bulk_create([User(id = None, username = f'user{i}', password_hash = password_hash) for i in range(1, config.users + 1)])
+
+        Post.bulk_create([
+            Post(f'Post {i} ' + ' '.join(rng.choices(WORDS, k = 6)), ' '.join(rng.choices(WORDS, k = rng.randint(20, 120))), rng.randint(1, config.users))
+            for i in range(1, config.posts + 1)
+        ])
+        Reply.bulk_create([
+            Reply(rng.randint(1, config.posts), rng.randint(1, config.users), ' '.join(rng.choices(WORDS, k = rng.randint(5, 40))))
+            for _ in range(config.replies)
+        ])
+        Like.bulk_create([Like(post_id, user_id) for post_id, user_id in _like_pairs(config, rng)])
+
+        # Espalha as datas dos posts, um a cada minuto, na ordem dos ids
+        db = get_db()
+        db.execute("UPDATE post SET created = datetime('2024-01-01', '+' || id || ' minutes')")
+        db.commit()
+        db.execute('ANALYZE')
+
+    return {**asdict(config), 'seconds': round(time.perf_counter() - start, 2)}
+
+
+WORDS = (
+    'python flask sqlite cache banco dados post resposta usuario feed like busca indice pagina teste '
+    'desempenho consulta rapido lento memoria processo thread servidor cliente rede arquivo texto '
+    'blog tempo dia noite cafe codigo erro ajuda ideia projeto versao'
+).split()
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Adiciona as opções do dataset a um parser, com os valores padrão de DatasetConfig."""
+
+    defaults = DatasetConfig()
+    for field, value in asdict(defaults).items():
+        parser.add_argument(f'--{field}', type = type(value), default = value)
+
+
+def config_from_args(args: argparse.Namespace) -> DatasetConfig:
+    return DatasetConfig(**{field: getattr(args, field) for field in asdict(DatasetConfig())})
+
+
+def main() -> None:
+
+    parser = argparse.ArgumentParser(description = __doc__.split('\n\n')[0])
+    parser.add_argument('path')
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    info = generate(args.path, config_from_args(args))
+    print(f'Dataset gerado em {info["seconds"]} s: {args.path}')
+
+
+if __name__ == '__main__':
+    main()
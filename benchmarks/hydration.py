@@ -0,0 +1,101 @@
+"""
+Compara o custo de carregar posts do banco de dados com 'Post.from_row' (__slots__, sem o despacho do __init__)
+e com o caminho anterior, que criava cada objeto com 'Post(*row)' e guardava os atributos em __dict__.
+
+```
+python -m benchmarks.hydration --rows 100000
+```
+"""
+
+import argparse
+import gc
+import sqlite3
+import time
+import tracemalloc
+from datetime import datetime
+
+from blog.models import Post
+
+
+class LegacyPost:
+    """Reprodução do Post anterior: atributos em __dict__ e __init__ que escolhe o formato pelos argumentos."""
+
+    def __init__(self, *args, **kwargs) -> None:
+
+        if len(args) == 6:
+            self.id = args[0]
+            self._user = args[1]
+            self.title = args[2]
+            self.body = args[3]
+            self.like_count = args[4]
+            self.created = args[5]
+        elif len(kwargs) == 6:
+            self.id = kwargs['id']
+            self._user = kwargs['user_id']
+            self.title = kwargs['title']
+            self.body = kwargs['body']
+            self.like_count = kwargs['like_count']
+            self.created = kwargs['created']
+        else:
+            raise ValueError
+
+
+def load_rows(count: int) -> list[sqlite3.Row]:
+    """Cria um banco de dados em memória com 'count' posts e retorna as linhas de 'SELECT *'."""
+
+    sqlite3.register_converter('timestamp', lambda v: datetime.fromisoformat(v.decode()))
+    db = sqlite3.connect(':memory:', detect_types = sqlite3.PARSE_DECLTYPES)
+    db.row_factory = sqlite3.Row
+    db.execute(
+        'CREATE TABLE post (id INTEGER PRIMARY KEY, user_id INTEGER, title TEXT, body TEXT,'
+        ' like_count INTEGER, created TIMESTAMP)'
+    )
+    db.executemany(
+        'INSERT INTO post VALUES (?,?,?,?,?,?)',
+        ((i, i % 100, f'title {i}', f'body {i}' * 10, i % 7, '2024-01-01 00:00:00') for i in range(1, count + 1))
+    )
+    return db.execute('SELECT * FROM post').fetchall()
+
+
+def measure(name: str, hydrate, rows: list[sqlite3.Row], repeat: int) -> dict[str, float]:
+
+    best = float('inf')
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        objs = hydrate(rows)
+        best = min(best, time.perf_counter() - start)
+        del objs
+
+    gc.collect()
+    tracemalloc.start()
+    objs = hydrate(rows)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objs
+
+    print(f'{name:<28} {best * 1000:8.1f} ms {memory / 1024 / 1024:8.1f} MiB')
+    return {'time': best, 'memory': memory}
+
+
+def main() -> None:
+
+    parser = argparse.ArgumentParser(description = __doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type = int, default = 100_000)
+    parser.add_argument('--repeat', type = int, default = 5)
+    args = parser.parse_args()
+
+    rows = load_rows(args.rows)
+    print(f'{args.rows} posts, melhor de {args.repeat} execuções')
+
+    legacy = measure('Post(*row) com __dict__', lambda rows: [LegacyPost(*row) for row in rows], rows, args.repeat)
+    legacy_kwargs = measure('Post(**row) com __dict__', lambda rows: [LegacyPost(**row) for row in rows], rows, args.repeat)
+    current = measure('Post.from_row com __slots__', lambda rows: [Post.from_row(row) for row in rows], rows, args.repeat)
+
+    print(f'tempo: {legacy["time"] / current["time"]:.2f}x mais rápido que Post(*row), '
+          f'{legacy_kwargs["time"] / current["time"]:.2f}x que Post(**row)')
+    print(f'memória: {legacy["memory"] / current["memory"]:.2f}x menor')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+"""
+Mede a latência (percentis), a vazão e a quantidade de consultas SQL das views e dos modelos principais
+sobre um dataset sintético, e grava os resultados em JSON.
+
+```
+python -m benchmarks.run --output results.json
+python -m benchmarks.run --baseline baseline.json --threshold 0.15
+```
+
+Com '--baseline', compara os resultados e termina com código 1 se algum cenário regrediu.
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable
+
+from flask import Flask
+
+from blog import create_app
+from blog.db import get_db, get_pool
+from blog.models import User, Post
+
+from . import dataset
+from .compare import compare, print_comparison
+
+
+class QueryCounter:
+    """Conta os comandos SQL executados nas requisições e nos contextos do app."""
+
+    def __init__(self) -> None:
+        self.count = 0
+
+    def __call__(self, statement: str) -> None:
+        self.count += 1
+
+    def install(self, app: Flask) -> None:
+        # Precisa ser registrado antes da primeira requisição
+        app.before_request(lambda: get_db().set_trace_callback(self))
+
+
+def percentile(values: list[float], p: float) -> float:
+    """Percentil por interpolação linear entre os valores ordenados."""
+
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    low = int(k)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (k - low)
+
+
+def measure(name: str, operation: Callable[[int], object], counter: QueryCounter, iterations: int, warmup: int) -> dict:
+    """Executa 'operation' 'warmup' vezes sem medir e 'iterations' vezes medindo cada execução."""
+
+    for i in range(warmup):
+        operation(i)
+
+    gc.collect()
+    latencies = []
+    queries = 0
+    start = time.perf_counter()
+    for i in range(iterations):
+        counter.count = 0
+        begin = time.perf_counter()
+        operation(warmup + i)
+        latencies.append(time.perf_counter() - begin)
+        queries += counter.count
+    total = time.perf_counter() - start
+
+    result = {
+        'iterations': iterations,
+        'mean_ms': statistics.fmean(latencies) * 1000,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p90_ms': percentile(latencies, 90) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'max_ms': max(latencies) * 1000,
+        'ops_per_s': iterations / total,
+        'queries_per_op': queries / iterations,
+    }
+    print(
+        f'{name:<14} p50 {result["p50_ms"]:8.2f} ms  p90 {result["p90_ms"]:8.2f} ms  p99 {result["p99_ms"]:8.2f} ms  '
+        f'{result["ops_per_s"]:9.1f} op/s  {result["queries_per_op"]:6.1f} consultas'
+    )
+    return result
+
+
+def _check(response) -> None:
+    if response.status_code >= 400:
+        raise RuntimeError(f'{response.request.path}: {response.status_code}')
+
+
+def scenarios(app: Flask, config: dataset.DatasetConfig, counter: QueryCounter, rng: random.Random) -> dict[str, Callable[[int], object]]:
+    """Retorna as operações medidas, indexadas pelo nome do cenário."""
+
+    client = app.test_client()
+    anonymous = app.test_client()
+    _check(client.post('/auth/login', data = {'username': 'user1', 'password': dataset.PASSWORD}))
+    login_client = app.test_client()
+
+    def in_context(operation: Callable[[], object]) -> Callable[[int], object]:
+        """As operações de modelo rodam em um contexto novo a cada vez, como em uma requisição."""
+
+        def run(i: int):
+            with app.app_context():
+                get_db().set_trace_callback(counter)
+                result = operation()
+                get_db().set_trace_callback(None)
+            return result
+        return run
+
+    def like(i: int):
+        _check(client.post(f'/like/{rng.randint(1, config.posts)}'))
+
+    def reply(i: int):
+        _check(client.post(f'/reply/{rng.randint(1, config.posts)}', data = {'body': f'resposta {i}'}))
+
+    def create(i: int):
+        _check(client.post('/create', data = {'title': f'bench {i}', 'body': 'corpo do post'}))
+
+    def login(i: int):
+        _check(login_client.post('/auth/login', data = {'username': f'user{rng.randint(1, config.users)}', 'password': dataset.PASSWORD}))
+
+    return {
+        'index': lambda i: _check(client.get('/')),
+        'index_anon': lambda i: _check(anonymous.get('/')),
+        'like': like,
+        'reply': reply,
+        'create': create,
+        'login': login,
+        'get_all': in_context(User.get_all),
+        'filter': in_context(lambda: Post.filter(user_id = rng.randint(1, config.users))),
+        'hydration': in_context(lambda: Post.query.limit(1000).all()),
+    }
+
+
+# Cenários lentos por natureza (hash de senha) usam menos iterações
+SLOW = {'login': 10}
+
+
+def run(config: dataset.DatasetConfig, iterations: int, warmup: int, only: list[str] | None, database: str | None) -> dict:
+
+    # O diretório temporário guarda o cache de fragmentos e, sem '--database', o banco gerado
+    with tempfile.TemporaryDirectory() as directory:
+        path = database or os.path.join(directory, 'bench.sqlite')
+        print(f'Gerando o dataset em {path}...')
+        info = dataset.generate(path, config)
+
+        app = create_app({
+            'DATABASE': path,
+            'FRAGMENT_CACHE_PATH': os.path.join(directory, 'cache.sqlite'),
+            # O limitador recusaria as requisições repetidas do benchmark
+            'RATELIMIT_ENABLED': False,
+        })
+        counter = QueryCounter()
+        counter.install(app)
+        rng = random.Random(config.seed)
+
+        results = {}
+        try:
+            for name, operation in scenarios(app, config, counter, rng).items():
+                if only and name not in only:
+                    continue
+                count = min(iterations, SLOW.get(name, iterations))
+                results[name] = measure(name, operation, counter, count, min(warmup, count))
+        finally:
+            # Fecha as conexões antes que o diretório seja apagado
+            with app.app_context():
+                get_pool().close()
+
+    return {
+        'meta': {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'dataset': info,
+        },
+        'results': results,
+    }
+
+
+def main() -> None:
+
+    parser = argparse.ArgumentParser(description = __doc__.split('\n\n')[0])
+    dataset.add_arguments(parser)
+    parser.add_argument('--iterations', type = int, default = 200)
+    parser.add_argument('--warmup', type = int, default = 20)
+    parser.add_argument('--only', nargs = '+', help = 'Executa apenas os cenários fornecidos.')
+    parser.add_argument('--database', help = 'Caminho do banco de dados gerado (padrão: um arquivo temporário).')
+    parser.add_argument('--output', default = 'bench_results.json')
+    parser.add_argument('--baseline', help = 'Resultados anteriores para comparação.')
+    parser.add_argument('--threshold', type = float, default = 0.10, help = 'Aumento relativo tolerado na latência p50.')
+    args = parser.parse_args()
+
+    results = run(dataset.config_from_args(args), args.iterations, args.warmup, args.only, args.database)
+    with open(args.output, 'w', encoding = 'utf8') as f:
+        json.dump(results, f, indent = 2)
+    print(f'Resultados gravados em {args.output}')
+
+    if args.baseline:
+        with open(args.baseline, encoding = 'utf8') as f:
+            baseline = json.load(f)
+        comparison = compare(baseline, results, args.threshold)
+        print_comparison(comparison)
+        if any(row['regression'] for row in comparison):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
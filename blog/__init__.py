@@ -9,7 +9,107 @@ def create_app(test_config = None) -> Flask:
     app = Flask(__name__, instance_relative_config = True)
     app.config.from_mapping(
         SECRET_KEY = '123',
-        DATABASE = os.path.join(app.instance_path, 'blog.sqlite')
+        DATABASE = os.path.join(app.instance_path, 'blog.sqlite'),
+        DATABASE_POOL_SIZE = 5,
+        DATABASE_POOL_IDLE_TIMEOUT = 300,
+        DATABASE_POOL_HEALTH_CHECK = True,
+        DATABASE_POOL_TIMEOUT = 10,
+        # Aplicados em cada nova conexão. O WAL permite leituras durante as escritas
+        SQLITE_PRAGMAS = {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'mmap_size': 64 * 1024 * 1024,
+            'cache_size': -16000,
+            'temp_store': 'MEMORY',
+            'busy_timeout': 5000,
+        },
+        # Segundos entre execuções de 'wal_checkpoint' e 'optimize' (None desativa)
+        SQLITE_CHECKPOINT_INTERVAL = 60,
+        SQLITE_OPTIMIZE_INTERVAL = 3600,
+        # Registra os comandos SQL de cada requisição no cabeçalho Server-Timing e em uma linha de log.
+        # Com SQL_NPLUSONE_THRESHOLD, comandos repetidos mais vezes que o limite geram um aviso (ou erro)
+        SQL_INSTRUMENTATION = False,
+        SQL_NPLUSONE_THRESHOLD = None,
+        SQL_NPLUSONE_RAISE = False,
+        # Profiler por requisição (ver blog/profiler.py): todas as requisições com PROFILER_ENABLED,
+        # as que enviam o cabeçalho 'X-Profile-Token' igual a PROFILER_TOKEN, ou uma fração PROFILER_SAMPLE_RATE.
+        # Os PROFILER_MAX_FILES perfis mais recentes ficam em PROFILER_DIR
+        PROFILER_ENABLED = False,
+        PROFILER_TOKEN = None,
+        PROFILER_SAMPLE_RATE = 0.0,
+        PROFILER_DIR = os.path.join(app.instance_path, 'profiles'),
+        PROFILER_MAX_FILES = 100,
+        PROFILER_TOP = 30,
+        POSTS_PER_PAGE = 20,
+        SEARCH_RESULTS_PER_PAGE = 20,
+        # 'memory', 'sqlite' (compartilhado entre processos) ou None para desativar
+        FRAGMENT_CACHE = 'memory',
+        FRAGMENT_CACHE_SIZE = 1000,
+        FRAGMENT_CACHE_PATH = os.path.join(app.instance_path, 'cache.sqlite'),
+        # Incrementar ao alterar 'blog/_post.html', para descartar os fragmentos antigos
+        FRAGMENT_CACHE_VERSION = 1,
+        # Usuários logados ficam em cache por até USER_CACHE_TTL segundos, no mesmo backend do cache de fragmentos.
+        # Com USER_SESSION_SNAPSHOT, o username também fica na sessão e evita até a consulta ao cache
+        USER_CACHE_SIZE = 1000,
+        USER_CACHE_TTL = 300,
+        USER_SESSION_SNAPSHOT = False,
+        # Se True, os likes ficam em memória e são gravados em lotes
+        # a cada LIKE_FLUSH_INTERVAL milissegundos ou LIKE_FLUSH_EVENTS eventos
+        LIKE_WRITE_BEHIND = False,
+        LIKE_FLUSH_INTERVAL = 500,
+        LIKE_FLUSH_EVENTS = 100,
+        # Máximo de posts em uma requisição para '/likes'
+        LIKE_BATCH_MAX = 100,
+        # Atualizações ao vivo em '/events' (ver blog/events.py). Tempos em segundos, exceto EVENTS_RETRY (ms).
+        # Cada conexão aberta ocupa uma thread do servidor por até EVENTS_MAX_LIFETIME segundos, então só deve
+        # ser ativado com workers com threads ou assíncronos (ex.: gunicorn --threads ou gevent), nunca com
+        # workers síncronos, que ficariam todos presos nas conexões
+        EVENTS_ENABLED = False,
+        EVENTS_COALESCE_WINDOW = 0.2,
+        EVENTS_MAX_SUBSCRIBERS = 100,
+        EVENTS_MAX_PENDING = 500,
+        EVENTS_HISTORY = 100,
+        EVENTS_HEARTBEAT = 15,
+        EVENTS_MAX_IDLE = 60,
+        EVENTS_MAX_LIFETIME = 300,
+        EVENTS_RETRY = 5000,
+        # Hashes de senha são calculados em PASSWORD_HASH_WORKERS processos (0 calcula no próprio processo).
+        # Ao alterar o método, as senhas antigas são atualizadas no próximo login
+        PASSWORD_HASH_METHOD = 'scrypt:32768:8:1',
+        PASSWORD_HASH_WORKERS = 2,
+        PASSWORD_HASH_MAX_CONCURRENCY = 8,
+        PASSWORD_HASH_QUEUE_TIMEOUT = 5,
+        # Limites por endpoint: 'limit' requisições a cada 'period' segundos por cliente (ver blog/ratelimit.py).
+        # 'sqlite' compartilha os limites entre os processos
+        RATELIMIT_ENABLED = True,
+        RATELIMIT_STORAGE = 'memory',
+        RATELIMIT_STORE_SIZE = 10000,
+        RATELIMIT_PATH = os.path.join(app.instance_path, 'ratelimit.sqlite'),
+        RATELIMITS = {
+            'auth.login': {'limit': 10, 'period': 60, 'key': 'ip', 'methods': ('POST',)},
+            'auth.register': {'limit': 5, 'period': 300, 'key': 'ip', 'methods': ('POST',)},
+            'blog.like': {'limit': 30, 'period': 10, 'key': 'user'},
+            'blog.like_batch': {'limit': 30, 'period': 10, 'key': 'user'},
+            'blog.reply': {'limit': 10, 'period': 60, 'key': 'user', 'methods': ('POST',)},
+        },
+        # Pacotes de CSS de cada página, gerados por 'flask build-assets' (ver blog/assets.py)
+        ASSET_BUNDLES = {
+            'base': ['style.css', 'menu.css'],
+            'auth': ['style.css', 'menu.css', 'auth.css'],
+            'index': ['style.css', 'menu.css', 'index.css'],
+            'search': ['style.css', 'menu.css', 'index.css', 'search.css'],
+            'create': ['style.css', 'menu.css', 'create.css'],
+            'reply': ['style.css', 'menu.css', 'reply.css'],
+        },
+        # Compressão das respostas com gzip ou deflate, a partir de COMPRESS_MIN_SIZE bytes.
+        # Os tipos em COMPRESS_SKIP_MIMETYPES (prefixos) nunca são comprimidos
+        COMPRESS_ENABLED = True,
+        COMPRESS_LEVEL = 6,
+        COMPRESS_MIN_SIZE = 500,
+        COMPRESS_SKIP_MIMETYPES = (
+            'image/', 'video/', 'audio/', 'font/woff', 'application/zip', 'application/gzip',
+            'text/event-stream',
+        )
     )
 
     if test_config is None:
@@ -27,8 +127,19 @@ def create_app(test_config = None) -> Flask:
         return 'Hello, world!'
 
     # Inicialização do app
-    from . import db
+    from . import db, cache, likes, search, hashing, ratelimit, assets, compress, events, profiler
+    # A compressão é registrada primeiro para rodar depois de todos os outros after_request,
+    # e o profiler antes dos outros before_request, para medir a requisição inteira
+    compress.init_app(app)
+    profiler.init_app(app)
     db.init_app(app)
+    cache.init_app(app)
+    likes.init_app(app)
+    events.init_app(app)
+    search.init_app(app)
+    hashing.init_app(app)
+    ratelimit.init_app(app)
+    assets.init_app(app)
 
     # Registro dos blueprint's
     from . import auth, blog
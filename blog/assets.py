@@ -0,0 +1,180 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import click
+from flask import current_app, request, send_from_directory, url_for, Flask
+from flask.cli import with_appcontext
+from markupsafe import Markup, escape
+
+from .messages import ASSETS_BUILT
+
+
+# Pasta dentro de 'static' com os arquivos gerados por 'build-assets'
+DIST = 'dist'
+
+# Tamanho do hash do conteúdo no nome dos arquivos
+HASH_LENGTH = 10
+
+# Os arquivos gerados nunca mudam de conteúdo sem mudar de nome
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def minify_css(css: str) -> str:
+    '''
+    Remove comentários e espaços desnecessários.
+    Não interpreta strings, o que basta para o CSS do blog, que não tem espaços significativos dentro de aspas.
+    '''
+
+    css = re.sub(r'/\*.*?\*/', '', css, flags = re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{}:;,>])\s*', r'\1', css)
+    css = css.replace(';}', '}')
+    return css.strip()
+
+
+def _write_hashed(dist: str, name: str, ext: str, content: bytes) -> str:
+    '''Grava o conteúdo e sua versão gzip com o hash no nome e retorna o nome relativo a 'static'.'''
+
+    digest = hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+    filename = f'{name}.{digest}{ext}'
+    path = os.path.join(dist, filename)
+
+    with open(path, 'wb') as f:
+        f.write(content)
+    # mtime fixo para que o .gz seja igual entre builds do mesmo conteúdo
+    with open(path + '.gz', 'wb') as f:
+        f.write(gzip.compress(content, compresslevel = 9, mtime = 0))
+    return f'{DIST}/{filename}'
+
+
+def build(static_folder: str, bundles: dict[str, list[str]]) -> dict:
+    '''
+    Gera os pacotes de CSS de cada página e uma cópia com hash de cada arquivo estático,
+    mais as versões gzip, e grava o manifesto que relaciona os nomes originais aos gerados.
+    '''
+
+    dist = os.path.join(static_folder, DIST)
+    os.makedirs(dist, exist_ok = True)
+    # Remove os arquivos de builds anteriores
+    for filename in os.listdir(dist):
+        os.remove(os.path.join(dist, filename))
+
+    manifest = {'bundles': {}, 'files': {}}
+
+    for name, sources in bundles.items():
+        css = []
+        for source in sources:
+            with open(os.path.join(static_folder, source), encoding = 'utf8') as f:
+                css.append(f.read())
+        content = minify_css('\n'.join(css)).encode()
+        manifest['bundles'][name] = _write_hashed(dist, name, '.css', content)
+
+    for filename in sorted(os.listdir(static_folder)):
+        path = os.path.join(static_folder, filename)
+        if not os.path.isfile(path):
+            continue
+        with open(path, 'rb') as f:
+            content = f.read()
+        if filename.endswith('.css'):
+            content = minify_css(content.decode('utf8')).encode()
+        name, ext = os.path.splitext(filename)
+        manifest['files'][filename] = _write_hashed(dist, name, ext, content)
+
+    with open(os.path.join(dist, 'manifest.json'), 'w', encoding = 'utf8') as f:
+        json.dump(manifest, f, indent = 2)
+    return manifest
+
+
+def load_manifest(static_folder: str) -> dict | None:
+    '''Retorna o manifesto do último build, ou None se os arquivos não foram gerados.'''
+
+    try:
+        with open(os.path.join(static_folder, DIST, 'manifest.json'), encoding = 'utf8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def get_manifest() -> dict | None:
+    return current_app.extensions.get('asset_manifest')
+
+
+def build_version() -> str:
+    '''Identifica o build atual pelos nomes com hash do manifesto, ou retorna '' se os arquivos não foram gerados.'''
+
+    manifest = get_manifest()
+    if manifest is None:
+        return ''
+    return ','.join(sorted(manifest['bundles'].values()) + sorted(manifest['files'].values()))
+
+
+def stylesheets(bundle: str) -> Markup:
+    '''
+    Retorna as tags <link> do pacote de CSS da página.
+    Sem um build, retorna uma tag para cada arquivo do pacote, para que o desenvolvimento não dependa do build.
+    '''
+
+    manifest = get_manifest()
+    if manifest is not None and bundle in manifest['bundles']:
+        hrefs = [url_for('static', filename = manifest['bundles'][bundle])]
+    else:
+        hrefs = [url_for('static', filename = source) for source in current_app.config['ASSET_BUNDLES'][bundle]]
+
+    return Markup('\n'.join(f'<link rel="stylesheet" href="{escape(href)}">' for href in hrefs))
+
+
+def _hashed_url_defaults(endpoint: str, values: dict) -> None:
+    '''Troca o nome do arquivo em url_for('static', ...) pelo nome com hash do manifesto.'''
+
+    if endpoint != 'static':
+        return
+    manifest = get_manifest()
+    if manifest is not None:
+        filename = values.get('filename')
+        values['filename'] = manifest['files'].get(filename, filename)
+
+
+def send_static(filename: str):
+    '''
+    Serve os arquivos estáticos. Os arquivos gerados pelo build são imutáveis e, se o cliente aceitar,
+    são enviados já comprimidos com gzip, sem comprimir a cada requisição.
+    '''
+
+    app = current_app
+    if not filename.startswith(f'{DIST}/'):
+        return app.send_static_file(filename)
+
+    gz = filename + '.gz'
+    if 'gzip' in request.accept_encodings and os.path.isfile(os.path.join(app.static_folder, gz)):
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response = send_from_directory(app.static_folder, gz, mimetype = mimetype, max_age = IMMUTABLE_MAX_AGE)
+        response.content_encoding = 'gzip'
+    else:
+        response = send_from_directory(app.static_folder, filename, max_age = IMMUTABLE_MAX_AGE)
+
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+@click.command('build-assets')
+@with_appcontext
+def build_assets_command():
+    '''Gera os pacotes de CSS, os arquivos com hash e as versões gzip em static/dist.'''
+
+    manifest = build(current_app.static_folder, current_app.config['ASSET_BUNDLES'])
+    current_app.extensions['asset_manifest'] = manifest
+    click.echo(ASSETS_BUILT.format(len(manifest['bundles']), len(manifest['files'])))
+
+
+def init_app(app: Flask) -> None:
+
+    app.extensions['asset_manifest'] = load_manifest(app.static_folder)
+    app.view_functions['static'] = send_static
+    app.url_defaults(_hashed_url_defaults)
+    app.add_template_global(stylesheets)
+    app.cli.add_command(build_assets_command)
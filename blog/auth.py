@@ -1,10 +1,11 @@
 from flask import (
     Blueprint, flash, g, redirect, render_template, request, session, url_for
 )
-from werkzeug.security import check_password_hash
 import functools
 from typing import Callable
-from .db import get_db
+from .db import get_db, transaction
+from .cache import get_user_cache, invalidate_user
+from .hashing import get_hasher
 
 from .messages import (
     USERNAME_INVALIDO, SENHA_INVALIDA, USERNAME_JA_REGISTRADO, USERNAME_INCORRETO, SENHA_INCORRETA, SENHAS_NAO_COINCIDEM
@@ -52,13 +53,16 @@ def login():
         username = request.form['username']
         password = request.form['password']
         user = User.get(username = username)
+        hasher = get_hasher()
 
         if user is None:
             flash(USERNAME_INCORRETO)
-        elif not check_password_hash(user.password_hash, password):
+        elif not hasher.verify(user.password_hash, password):
             flash(SENHA_INCORRETA)
         else:
             flash(None)
+            if hasher.needs_rehash(user.password_hash):
+                rehash_password(user, password)
             session.clear()
             session['user_id'] = user.id
             return redirect(url_for('index'))
@@ -67,6 +71,22 @@ def login():
     return render_template('auth/login.html')
 
 
+def rehash_password(user: User, password: str) -> None:
+    '''
+    Grava um novo hash da senha com os parâmetros configurados.
+    Só é possível no login, quando a senha em texto está disponível.
+    '''
+
+    password_hash = get_hasher().hash(password)
+    with transaction() as db:
+        db.execute(
+            'UPDATE user SET password = ? WHERE id = ?',
+            (password_hash, user.id)
+        )
+    user.password_hash = password_hash
+    invalidate_user(user.id)
+
+
 @bp.before_app_request
 def load_logged_in_user():
 
@@ -75,11 +95,8 @@ def load_logged_in_user():
         g.user = None
         return
     
-    g.user = User.get(id = user_id)
-    # g.user = get_db().execute(
-    #     'SELECT * FROM user WHERE id = ?',
-    #     (user_id,)
-    # ).fetchone()
+    # Normalmente vem do cache (ou da sessão), sem consultar a tabela user
+    g.user = get_user_cache().get(user_id)
 
 
 @bp.route('/logout')
@@ -1,26 +1,126 @@
 from flask import (
-    Blueprint, flash, g, redirect, render_template, request, url_for, jsonify
+    Blueprint, flash, g, redirect, render_template, request, url_for, jsonify, current_app, session
 )
 from werkzeug.exceptions import abort
+from datetime import datetime, timezone
+import hashlib
 
+from .assets import build_version
 from .auth import login_required
-from .db import get_db
-from .models import Post, Like, Reply
-from .messages import POST_NAO_EXISTE, SEM_TITULO, SEM_BODY
+from .cache import get_cache, feed_version, bump_feed
+from .db import transaction
+from .events import get_hub, publish, stream
+from .likes import get_buffer, set_likes
+from .search import search as search_posts
+from .models import Post, Reply
+from .messages import POST_NAO_EXISTE, SEM_TITULO, SEM_BODY, CURSOR_INVALIDO, LIKES_INVALIDOS, EVENTS_FULL
 
 
 bp = Blueprint('blog', __name__)
 
 
-def deu_like(post_id: int, user_id: int) -> bool:
-    like = Like.get(post_id = post_id, user_id = user_id)
-    return like is not None
-        
+def encode_cursor(post: Post) -> str:
+    """Retorna o cursor de paginação que identifica a posição de 'post' no feed."""
+    return f'{post.created.isoformat()}_{post.id}'
+
+
+def decode_cursor(cursor: str | None) -> tuple[str, int] | None:
+    """
+    Converte um cursor gerado por 'encode_cursor' na chave (created, id) usada pelo banco de dados.
+    Se o cursor for inválido, lança uma exceção 400.
+    """
+
+    if cursor is None:
+        return None
+
+    created, _, id = cursor.rpartition('_')
+    try:
+        return str(datetime.fromisoformat(created)), int(id)
+    except ValueError:
+        abort(400, CURSOR_INVALIDO)
+
+
+def feed_url(post_id: int, created: datetime) -> str:
+    """Retorna a URL do feed que começa no post fornecido."""
+
+    # O cursor 'before' é exclusivo, então usa a posição logo depois do post
+    return url_for('blog.index', before = f'{created.isoformat()}_{post_id + 1}', _anchor = f'post-{post_id}')
+
+
+def feed_etag(version: int) -> str:
+    """
+    Retorna o validador do feed para o usuário logado e a página pedida.
+    O usuário faz parte do validador porque o HTML muda para cada um (curtidas, botão de editar).
+    A versão dos fragmentos e o build dos arquivos estáticos também, porque um deploy que muda os templates
+    ou os arquivos gerados não altera a versão do feed, que persiste entre reinícios com FRAGMENT_CACHE='sqlite'.
+    """
+
+    user_id = g.user.id if g.user else 0
+    fragments = current_app.config['FRAGMENT_CACHE_VERSION']
+    key = f'{version}:{fragments}:{build_version()}:{user_id}:{request.full_path}'
+    return hashlib.sha1(key.encode()).hexdigest()[:20]
+
 
 @bp.route('/')
 def index():
-    posts = Post.get_all()[::-1]
-    return render_template('blog/index.html', posts=posts, deu_like=deu_like)
+
+    # Se o cliente já tem esta versão do feed, responde sem consultar os posts nem renderizar
+    # Mensagens pendentes precisam ser exibidas, então nesse caso o feed é sempre renderizado
+    version = feed_version()
+    etag = feed_etag(version)
+    if '_flashes' not in session and request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status = 304)
+        return _set_validators(response, etag, version)
+
+    posts, has_newer, has_older = Post.get_page(
+        current_app.config['POSTS_PER_PAGE'],
+        before = decode_cursor(request.args.get('before')),
+        after = decode_cursor(request.args.get('after'))
+    )
+
+    # Apenas os posts sem fragmento em cache precisam do autor e das respostas
+    cache = get_cache()
+    keys = cache.keys('post', [post.id for post in posts])
+    cached = cache.get_many(keys.values())
+    missing = [post for post in posts if keys[post.id] not in cached]
+
+    Post.prefetch(missing, 'user', 'replies__user')
+    Post.prefetch(posts, liked_by = g.user)
+
+    buffer = get_buffer()
+    if buffer is not None:
+        buffer.merge(posts, g.user.id if g.user else None)
+
+    fragments = {}
+    for post in posts:
+        fragment = cached.get(keys[post.id])
+        if fragment is None:
+            fragment = render_template('blog/_post.html', post = post)
+            cache.set(keys[post.id], fragment)
+        fragments[post.id] = fragment
+
+    newer = encode_cursor(posts[0]) if posts and has_newer else None
+    older = encode_cursor(posts[-1]) if posts and has_older else None
+
+    response = current_app.make_response(render_template(
+        'blog/index.html',
+        posts = posts,
+        fragments = fragments,
+        newer = newer,
+        older = older
+    ))
+    return _set_validators(response, etag, version)
+
+
+def _set_validators(response, etag: str, version: int):
+    '''Adiciona ETag, Last-Modified e Cache-Control à resposta do feed.'''
+    response.set_etag(etag)
+    response.last_modified = datetime.fromtimestamp(version / 1000, timezone.utc)
+    # O HTML depende da sessão, então não pode ser guardado por caches compartilhados
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+    return response
 
 
 @bp.route('/create', methods=('GET','POST'))
@@ -38,10 +138,12 @@ def create():
         else:
             flash(None)
 
+            # Um post novo ainda não tem fragmento em cache para invalidar
             Post.create_and_save(
                 title = title,
                 body = body
             )
+            bump_feed()
             return redirect(url_for('blog.index'))
         
     return render_template('blog/create.html')
@@ -61,13 +163,15 @@ def update(id: int):
         if not title:
             flash(SEM_TITULO)
         else:
-            db = get_db()
-            db.execute(
-                'UPDATE post SET title = ?, body = ? '
-                'WHERE id = ?',
-                (title, body, id)
-            )
-            db.commit()
+            with transaction() as db:
+                db.execute(
+                    'UPDATE post SET title = ?, body = ? '
+                    'WHERE id = ?',
+                    (title, body, id)
+                )
+            Post.forget(id)
+            get_cache().invalidate('post', id)
+            bump_feed()
             return redirect(url_for('blog.index'))
         
     return render_template('blog/update.html', post=post)
@@ -81,57 +185,108 @@ def delete(id: int):
     # Se não, é lançada uma exceção
     Post.get(id = id)
 
-    db = get_db()
-    db.execute(
-        'DELETE FROM post WHERE id = ?',
-        (id,)
-    )
-    db.commit()
+    with transaction() as db:
+        db.execute(
+            'DELETE FROM post WHERE id = ?',
+            (id,)
+        )
+    Post.forget(id)
+    get_cache().invalidate('post', id)
+    bump_feed()
     return redirect(url_for('blog.index'))
 
 
-@bp.route('/like/<int:post_id>', methods=('GET',))
-@login_required
-def like(post_id: int):
+def _json_object() -> dict:
+    '''Retorna o corpo JSON da requisição, que precisa ser um objeto; sem corpo, retorna um objeto vazio.'''
 
-    # Se o post não existir, será lançada uma exceção
-    Post.get(check_author = False, id = post_id)
+    data = request.get_json(silent = True)
+    if data is None:
+        return {}
+    if not isinstance(data, dict):
+        abort(400, LIKES_INVALIDOS)
+    return data
 
-    db = get_db()
-    if deu_like(post_id, g.user.id):
-        db.execute(
-            'DELETE FROM like WHERE post_id = ? AND user_id = ?',
-            (post_id, g.user.id)
-        )
-        db.execute(
-            'UPDATE post SET like_count = like_count - 1 WHERE id = ?',
-            (post_id,)
-        )
-        liked = False
-    else:
-        db.execute(
-            'INSERT INTO like (post_id, user_id) VALUES (?,?)',
-            (post_id, g.user.id)
-        )
-        db.execute(
-            'UPDATE post SET like_count = like_count + 1 WHERE id = ?',
-            (post_id,)
-        )
-        liked = True
 
-    db.commit()
+def _parse_liked(value) -> bool | None:
+    '''Valida o estado pedido para um like: True, False ou None para inverter.'''
+
+    if value is not None and not isinstance(value, bool):
+        abort(400, LIKES_INVALIDOS)
+    return value
 
-    like_count = db.execute(
-        'SELECT like_count FROM post WHERE id = ?',
-        (post_id,)
-    ).fetchone()[0]
 
+def change_likes(states: dict[int, bool | None]) -> dict[int, tuple[bool, int]]:
+    '''
+    Altera os likes do usuário logado e invalida os posts afetados.
+    Retorna o novo estado e a contagem de cada post que existe.
+    '''
+
+    buffer = get_buffer()
+    if buffer is None:
+        results = set_likes(g.user.id, states)
+    else:
+        results = {
+            post_id: buffer.toggle(post_id, g.user.id, liked)
+            for post_id, liked in states.items()
+            if Post.query.filter(id = post_id).exists()
+        }
+
+    cache = get_cache()
+    for post_id, (_, like_count) in results.items():
+        Post.forget(post_id)
+        cache.invalidate('post', post_id)
+        publish(post_id, likes = like_count)
+    if results:
+        bump_feed()
+    return results
+
+
+@bp.route('/like/<int:post_id>', methods=('POST',))
+@login_required
+def like(post_id: int):
+    '''Inverte o like do usuário no post, ou aplica o estado enviado em {"liked": true | false}.'''
+
+    data = _json_object()
+    results = change_likes({post_id: _parse_liked(data.get('liked'))})
+    if post_id not in results:
+        abort(404, POST_NAO_EXISTE)
+
+    liked, like_count = results[post_id]
     return jsonify({
         'liked': liked,
         'like_count': like_count
     })
 
 
+@bp.route('/likes', methods=('POST',))
+@login_required
+def like_batch():
+    '''
+    Aplica vários likes em uma única transação.
+    Recebe {"likes": [{"post_id": 1, "liked": true}, ...]} e retorna o estado final de cada post que existe.
+    '''
+
+    data = _json_object()
+    entries = data.get('likes')
+    if not isinstance(entries, list) or len(entries) > current_app.config['LIKE_BATCH_MAX']:
+        abort(400, LIKES_INVALIDOS)
+
+    states = {}
+    for entry in entries:
+        # bool é subclasse de int, então true/false seriam aceitos como os posts 1 e 0
+        if not isinstance(entry, dict) or type(entry.get('post_id')) is not int:
+            abort(400, LIKES_INVALIDOS)
+        # Se o mesmo post aparecer mais de uma vez, vale o último estado
+        states[entry['post_id']] = _parse_liked(entry.get('liked'))
+
+    results = change_likes(states)
+    return jsonify({
+        'likes': [
+            {'post_id': post_id, 'liked': liked, 'like_count': like_count}
+            for post_id, (liked, like_count) in results.items()
+        ]
+    })
+
 
 @bp.route('/reply/<int:post_id>', methods=('GET', 'POST'))
 @login_required
@@ -152,4 +307,65 @@ def reply(post_id: int):
         user = g.user.id,
         body = body
     )
+    get_cache().invalidate('post', post_id)
+    bump_feed()
+    # Sem os eventos ativados, a contagem seria uma consulta a mais em cada resposta
+    if current_app.config['EVENTS_ENABLED']:
+        publish(post_id, replies = Reply.query.filter(post_id = post_id).count())
     return redirect(url_for('blog.index'))
+
+
+@bp.route('/events')
+def events():
+    '''
+    Envia as alterações de likes e respostas dos posts como Server-Sent Events.
+    Cada evento 'posts' traz o estado novo de cada post alterado, como {"1": {"likes": 3, "replies": 2}}.
+    '''
+
+    # Cada conexão ocupa uma thread, então o stream só existe quando foi ativado (ver EVENTS_ENABLED)
+    if not current_app.config['EVENTS_ENABLED']:
+        abort(404)
+
+    hub = get_hub()
+    last_event_id = request.headers.get('Last-Event-ID', type = int)
+    subscriber = hub.subscribe(last_event_id)
+    if subscriber is None:
+        return current_app.response_class(EVENTS_FULL, status = 503, headers = {'Retry-After': '30'})
+
+    config = current_app.config
+    response = current_app.response_class(
+        stream(
+            hub,
+            subscriber,
+            heartbeat = config['EVENTS_HEARTBEAT'],
+            max_idle = config['EVENTS_MAX_IDLE'],
+            max_lifetime = config['EVENTS_MAX_LIFETIME'],
+            retry = config['EVENTS_RETRY']
+        ),
+        mimetype = 'text/event-stream'
+    )
+    response.cache_control.no_cache = True
+    # Impede que proxies como o nginx guardem os eventos em buffer
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@bp.route('/search')
+def search():
+
+    query = request.args.get('q', '').strip()
+    page = request.args.get('page', 1, type = int)
+    if page < 1:
+        abort(400)
+
+    per_page = current_app.config['SEARCH_RESULTS_PER_PAGE']
+    results, has_next = search_posts(query, per_page, (page - 1) * per_page)
+
+    return render_template(
+        'blog/search.html',
+        query = query,
+        results = results,
+        page = page,
+        has_next = has_next,
+        feed_url = feed_url
+    )
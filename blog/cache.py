@@ -0,0 +1,332 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable
+from flask import current_app, session, Flask
+from markupsafe import Markup, escape
+
+from .db import ThreadLocalConnection
+from .models import User
+
+
+class MemoryBackend:
+    '''Cache LRU em memória, limitado a 'max_size' fragmentos. Válido apenas para o processo atual.'''
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self._items: OrderedDict[str, str] = OrderedDict()
+        # As versões ficam fora do LRU: se fossem descartadas, uma versão antiga poderia voltar a valer
+        self._versions: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: Iterable[str]) -> dict[str, str]:
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._items:
+                    self._items.move_to_end(key)
+                    found[key] = self._items[key]
+        return found
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last = False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._items.pop(key, None)
+
+    def versions(self, names: Iterable[str]) -> dict[str, int]:
+        with self._lock:
+            return {name: self._versions.get(name, 0) for name in names}
+
+    def incr(self, name: str) -> int:
+        with self._lock:
+            self._versions[name] = self._versions.get(name, 0) + 1
+            return self._versions[name]
+
+    def touch(self, name: str, now: int) -> int:
+        with self._lock:
+            self._versions[name] = max(self._versions.get(name, 0) + 1, now)
+            return self._versions[name]
+
+
+class SQLiteBackend:
+    '''
+    Cache compartilhado entre processos, guardado em um arquivo SQLite separado do banco de dados do blog.
+    Quando passa de 'max_size' fragmentos, descarta os mais antigos.
+    '''
+
+    def __init__(self, path: str, max_size: int) -> None:
+        self.path = path
+        self.max_size = max_size
+        self._db = ThreadLocalConnection(path)
+        self._sets = 0
+
+        db = self._db()
+        db.executescript(
+            'CREATE TABLE IF NOT EXISTS fragment ('
+            '    key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL'
+            ');'
+            'CREATE INDEX IF NOT EXISTS idx_fragment_created ON fragment (created);'
+            'CREATE TABLE IF NOT EXISTS version ('
+            '    name TEXT PRIMARY KEY, value INTEGER NOT NULL'
+            ');'
+        )
+
+    def get_many(self, keys: Iterable[str]) -> dict[str, str]:
+        keys = list(keys)
+        if not keys:
+            return {}
+        rows = self._db().execute(
+            f'SELECT key, value FROM fragment WHERE key IN ({", ".join("?" for _ in keys)})',
+            keys
+        ).fetchall()
+        return dict(rows)
+
+    def set(self, key: str, value: str) -> None:
+        db = self._db()
+        db.execute(
+            'INSERT OR REPLACE INTO fragment (key, value, created) VALUES (?,?,?)',
+            (key, value, time.time())
+        )
+
+        # Verificar o tamanho a cada inserção custaria um COUNT por fragmento
+        self._sets += 1
+        if self._sets % 100 == 0:
+            db.execute(
+                'DELETE FROM fragment WHERE key IN ('
+                '    SELECT key FROM fragment ORDER BY created DESC LIMIT -1 OFFSET ?'
+                ')',
+                (self.max_size,)
+            )
+
+    def delete(self, key: str) -> None:
+        self._db().execute('DELETE FROM fragment WHERE key = ?', (key,))
+
+    def versions(self, names: Iterable[str]) -> dict[str, int]:
+        names = list(names)
+        found = {}
+        if names:
+            found = dict(self._db().execute(
+                f'SELECT name, value FROM version WHERE name IN ({", ".join("?" for _ in names)})',
+                names
+            ).fetchall())
+        return {name: found.get(name, 0) for name in names}
+
+    def incr(self, name: str) -> int:
+        return self._db().execute(
+            'INSERT INTO version (name, value) VALUES (?, 1) '
+            'ON CONFLICT (name) DO UPDATE SET value = value + 1 '
+            'RETURNING value',
+            (name,)
+        ).fetchone()[0]
+
+    def touch(self, name: str, now: int) -> int:
+        return self._db().execute(
+            'INSERT INTO version (name, value) VALUES (?, ?) '
+            'ON CONFLICT (name) DO UPDATE SET value = max(value + 1, excluded.value) '
+            'RETURNING value',
+            (name, now)
+        ).fetchone()[0]
+
+
+class NullBackend(MemoryBackend):
+    '''Não guarda fragmentos, apenas as versões. Usado quando o cache está desativado.'''
+
+    def __init__(self) -> None:
+        super().__init__(0)
+
+    def set(self, key: str, value: str) -> None:
+        pass
+
+
+class FragmentCache:
+    '''
+    Cache de fragmentos de HTML renderizados.
+    As chaves incluem a versão do objeto, que é incrementada a cada escrita que o afeta,
+    então um fragmento desatualizado nunca é lido novamente.
+
+    ```
+    keys = cache.keys('post', [1, 2])
+    fragments = cache.get_many(keys.values())
+    cache.invalidate('post', 1)
+    ```
+    '''
+
+    def __init__(self, backend: MemoryBackend | SQLiteBackend, version: int = 1) -> None:
+        self.backend = backend
+        self.version = version
+
+    def keys(self, kind: str, ids: Iterable[int]) -> dict[int, str]:
+        '''Retorna a chave atual do fragmento de cada objeto.'''
+
+        names = {id: f'{kind}:{id}' for id in ids}
+        versions = self.backend.versions(names.values())
+        return {
+            id: f'v{self.version}:{name}:{versions[name]}'
+            for id, name in names.items()
+        }
+
+    def get_many(self, keys: Iterable[str]) -> dict[str, str]:
+        '''Retorna os fragmentos encontrados, indexados pela chave.'''
+        return self.backend.get_many(keys)
+
+    def set(self, key: str, value: str) -> None:
+        self.backend.set(key, value)
+
+    def invalidate(self, kind: str, id: int) -> None:
+        '''Invalida o fragmento do objeto e descarta a versão anterior.'''
+
+        old = self.keys(kind, (id,))[id]
+        self.backend.incr(f'{kind}:{id}')
+        self.backend.delete(old)
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def feed_version() -> int:
+    '''
+    Retorna a versão atual do feed. A versão só aumenta e é o horário, em milissegundos,
+    da última alteração do feed (ou do início do processo, se ainda não houve alteração),
+    então também serve como 'Last-Modified'.
+    '''
+
+    backend = get_cache().backend
+    version = backend.versions(('feed',))['feed']
+    if version == 0:
+        version = backend.touch('feed', _now_ms())
+    return version
+
+
+def bump_feed() -> int:
+    '''Incrementa a versão do feed. Deve ser chamada por toda escrita que altera o feed.'''
+    return get_cache().backend.touch('feed', _now_ms())
+
+
+# Marcadores das partes do fragmento que dependem do usuário logado
+def slot(name: str) -> Markup:
+    '''Retorna o marcador de uma parte do fragmento que será preenchida para cada usuário por 'fill_slots'.'''
+    return Markup(f'\x00{name}\x00')
+
+
+def fill_slots(fragment: str, **values: str) -> Markup:
+    '''Substitui os marcadores de 'fragment' pelos valores fornecidos.'''
+
+    for name, value in values.items():
+        fragment = fragment.replace(f'\x00{name}\x00', escape(value))
+    return Markup(fragment)
+
+
+class UserCache:
+    '''
+    Cache LRU dos usuários logados, compartilhado entre as requisições do processo, para que
+    'load_logged_in_user' não consulte a tabela user a cada requisição.
+
+    Cada entrada guarda a versão 'user:<id>' do backend e é descartada quando a versão muda
+    (ver 'invalidate_user') ou depois de 'ttl' segundos, o que limita o atraso entre processos
+    quando o backend é a memória.
+
+    Com 'snapshot', a sessão também guarda (id, username, versão), e um usuário com a versão atual
+    é montado a partir da sessão assinada, sem consultar o cache nem o banco de dados.
+    '''
+
+    def __init__(self, backend: MemoryBackend | SQLiteBackend, max_size: int = 1000, ttl: float = 300, snapshot: bool = False) -> None:
+        self.backend = backend
+        self.max_size = max_size
+        self.ttl = ttl
+        self.snapshot = snapshot
+        # id -> (linha do usuário, versão, expiração)
+        self._items: OrderedDict[int, tuple[tuple, int, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _version(self, user_id: int) -> int:
+        return self.backend.versions((f'user:{user_id}',))[f'user:{user_id}']
+
+    def get(self, user_id: int) -> 'User | None':
+        '''Retorna o usuário com o id fornecido, ou None se ele não existir mais.'''
+
+        version = self._version(user_id)
+
+        if self.snapshot:
+            snapshot = session.get('user')
+            if snapshot is not None and snapshot[0] == user_id and snapshot[2] == version:
+                # Sem o hash da senha, então não entra no mapa de identidade
+                return User(user_id, snapshot[1], None)
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._items.get(user_id)
+            if entry is not None and entry[1] == version and entry[2] > now:
+                self._items.move_to_end(user_id)
+                row = entry[0]
+            else:
+                row = None
+
+        if row is not None:
+            user = User(*row)._identify()
+        else:
+            user = User.get(id = user_id)
+            if user is None:
+                return None
+            with self._lock:
+                self._items[user_id] = ((user.id, user.username, user.password_hash), version, now + self.ttl)
+                self._items.move_to_end(user_id)
+                while len(self._items) > self.max_size:
+                    self._items.popitem(last = False)
+
+        if self.snapshot:
+            session['user'] = [user.id, user.username, version]
+        return user
+
+    def invalidate(self, user_id: int) -> None:
+        '''Descarta o usuário do cache deste processo e, pela versão, dos outros processos e das sessões.'''
+
+        self.backend.incr(f'user:{user_id}')
+        with self._lock:
+            self._items.pop(user_id, None)
+
+
+def get_cache() -> FragmentCache:
+    '''Retorna o cache de fragmentos do app atual.'''
+    return current_app.extensions['fragment_cache']
+
+
+def get_user_cache() -> UserCache:
+    '''Retorna o cache de usuários do app atual.'''
+    return current_app.extensions['user_cache']
+
+
+def invalidate_user(user_id: int) -> None:
+    '''Deve ser chamada por toda escrita que altera a linha do usuário.'''
+    get_user_cache().invalidate(user_id)
+
+
+def init_app(app: Flask) -> None:
+
+    backend_name = app.config['FRAGMENT_CACHE']
+    size = app.config['FRAGMENT_CACHE_SIZE']
+
+    if backend_name == 'memory':
+        backend = MemoryBackend(size)
+    elif backend_name == 'sqlite':
+        backend = SQLiteBackend(app.config['FRAGMENT_CACHE_PATH'], size)
+    elif backend_name is None:
+        backend = NullBackend()
+    else:
+        raise ValueError(f'FRAGMENT_CACHE inválido: {backend_name!r}')
+
+    app.extensions['fragment_cache'] = FragmentCache(backend, app.config['FRAGMENT_CACHE_VERSION'])
+    app.extensions['user_cache'] = UserCache(
+        backend,
+        max_size = app.config['USER_CACHE_SIZE'],
+        ttl = app.config['USER_CACHE_TTL'],
+        snapshot = app.config['USER_SESSION_SNAPSHOT']
+    )
+    app.add_template_global(slot)
+    app.add_template_filter(fill_slots)
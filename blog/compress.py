@@ -0,0 +1,94 @@
+import gzip
+import zlib
+from typing import Iterable, Iterator
+from flask import request, Flask, Response
+
+
+def _compressor(encoding: str, level: int):
+    '''Retorna um compressor incremental no formato da codificação HTTP.'''
+
+    if encoding == 'gzip':
+        return zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    # 'deflate' no HTTP é o formato zlib, não o deflate puro
+    return zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS)
+
+
+def _compress_stream(chunks: Iterable[bytes], encoding: str, level: int) -> Iterator[bytes]:
+    '''Comprime as partes de uma resposta gerada sob demanda, enviando cada uma assim que é produzida.'''
+
+    compressor = _compressor(encoding, level)
+    for chunk in chunks:
+        # Z_SYNC_FLUSH para que o cliente receba cada parte sem esperar o fim da resposta
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class Compressor:
+    '''
+    Comprime as respostas com gzip ou deflate, conforme o cabeçalho Accept-Encoding.
+
+    Não comprime respostas menores que 'min_size' bytes, respostas de arquivos (que o servidor envia direto
+    do disco e, no caso dos gerados por 'build-assets', já têm uma versão gzip), nem os tipos em 'skip',
+    que já são comprimidos ou precisam chegar sem buffer (como text/event-stream).
+    '''
+
+    def __init__(self, level: int = 6, min_size: int = 500, skip: Iterable[str] = ()) -> None:
+        self.level = level
+        self.min_size = min_size
+        self.skip = tuple(skip)
+
+    def _compressible(self, response: Response) -> bool:
+
+        if response.status_code < 200 or response.status_code in (204, 304):
+            return False
+        if response.direct_passthrough or 'Content-Encoding' in response.headers:
+            return False
+        mimetype = response.mimetype or ''
+        return not mimetype.startswith(self.skip)
+
+    def __call__(self, response: Response) -> Response:
+
+        if not self._compressible(response):
+            return response
+
+        # O conteúdo varia com o cabeçalho mesmo quando esta resposta não foi comprimida
+        response.vary.add('Accept-Encoding')
+
+        encoding = request.accept_encodings.best_match(('gzip', 'deflate'))
+        if encoding is None or request.method == 'HEAD':
+            return response
+
+        if response.is_streamed:
+            response.response = _compress_stream(response.iter_encoded(), encoding, self.level)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                return response
+            if encoding == 'gzip':
+                data = gzip.compress(data, self.level, mtime = 0)
+            else:
+                data = zlib.compress(data, self.level)
+            response.set_data(data)
+
+        response.content_encoding = encoding
+        # O corpo comprimido não é idêntico byte a byte ao original, então o validador passa a ser fraco
+        etag, weak = response.get_etag()
+        if etag is not None and not weak:
+            response.set_etag(etag, weak = True)
+        return response
+
+
+def init_app(app: Flask) -> None:
+
+    if not app.config['COMPRESS_ENABLED']:
+        return
+
+    app.extensions['compressor'] = compressor = Compressor(
+        level = app.config['COMPRESS_LEVEL'],
+        min_size = app.config['COMPRESS_MIN_SIZE'],
+        skip = app.config['COMPRESS_SKIP_MIMETYPES']
+    )
+    app.after_request(compressor)
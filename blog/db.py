@@ -1,31 +1,429 @@
+import os
+import re
 import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
 from sqlite3 import Connection
 from datetime import datetime
+from typing import Callable, Iterator
 import click
-from flask import current_app, g, Flask
+from flask.cli import with_appcontext
+from flask import current_app, g, has_request_context, json, request, Flask
 
-from .messages import INIT_DB_MESSAGE
+from .exceptions import PoolTimeoutError, NPlusOneError
+from .messages import INIT_DB_MESSAGE, POOL_TIMEOUT, MIGRATION_APPLIED, NO_PENDING_MIGRATIONS, N_PLUS_ONE
+
+
+class ConnectionPool:
+    '''
+    Pool de conexões reutilizáveis com o banco de dados.
+    As conexões são entregues no início da requisição e devolvidas no fim, depois de um rollback,
+    para que continuem abertas (com o schema e o cache de páginas do SQLite já carregados).
+
+    :param factory: Função que cria uma nova conexão
+    :param max_size: Quantidade máxima de conexões abertas ao mesmo tempo
+    :param idle_timeout: Segundos que uma conexão pode ficar sem uso antes de ser fechada
+    :param health_check: Se True, verifica se a conexão responde antes de entregá-la
+    :param timeout: Segundos que 'acquire' espera por uma conexão livre antes de lançar PoolTimeoutError
+    '''
+
+    def __init__(
+        self,
+        factory: Callable[[], Connection],
+        max_size: int = 5,
+        idle_timeout: float = 300,
+        health_check: bool = True,
+        timeout: float = 10
+    ) -> None:
+
+        self.factory = factory
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check = health_check
+        self.timeout = timeout
+
+        # Conexões livres e o horário em que foram devolvidas
+        self._idle: deque[tuple[Connection, float]] = deque()
+        self._size = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            'created': 0,
+            'reused': 0,
+            'discarded': 0,
+            'waits': 0,
+            'wait_time': 0.0,
+            'max_wait': 0.0,
+            'timeouts': 0,
+        }
+
+    def acquire(self) -> Connection:
+        '''Retorna uma conexão livre, criando uma nova se o pool ainda não estiver cheio.'''
+
+        start = time.monotonic()
+        waited = False
+
+        with self._cond:
+            while True:
+
+                while self._idle:
+                    # A conexão usada mais recentemente é a que tem o cache mais "quente"
+                    conn, released = self._idle.pop()
+                    if time.monotonic() - released <= self.idle_timeout and self._is_healthy(conn):
+                        self._stats['reused'] += 1
+                        self._record_wait(waited, start)
+                        return conn
+                    self._discard(conn)
+
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+
+                remaining = self.timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeoutError(POOL_TIMEOUT)
+                waited = True
+                self._cond.wait(remaining)
+
+            self._record_wait(waited, start)
+
+        try:
+            conn = self.factory()
+        except BaseException:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._stats['created'] += 1
+        return conn
+
+    def release(self, conn: Connection) -> None:
+        '''Desfaz qualquer transação aberta e devolve a conexão ao pool.'''
+
+        try:
+            conn.rollback()
+        except sqlite3.Error:
+            with self._cond:
+                self._discard(conn)
+                self._cond.notify()
+            return
+
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def close(self) -> None:
+        '''Fecha todas as conexões livres.'''
+
+        with self._cond:
+            while self._idle:
+                self._discard(self._idle.pop()[0])
+
+    def stats(self) -> dict[str, int | float]:
+        '''Retorna as métricas do pool, incluindo quantas vezes e por quanto tempo foi preciso esperar por uma conexão.'''
+
+        with self._cond:
+            return {**self._stats, 'size': self._size, 'idle': len(self._idle)}
+
+    def _is_healthy(self, conn: Connection) -> bool:
+        if not self.health_check:
+            return True
+        try:
+            conn.execute('SELECT 1')
+        except sqlite3.Error:
+            return False
+        return True
+
+    def _discard(self, conn: Connection) -> None:
+        self._size -= 1
+        self._stats['discarded'] += 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def _record_wait(self, waited: bool, start: float) -> None:
+        if not waited:
+            return
+        wait = time.monotonic() - start
+        self._stats['waits'] += 1
+        self._stats['wait_time'] += wait
+        self._stats['max_wait'] = max(self._stats['max_wait'], wait)
+        current_app.logger.warning('Requisição esperou %.3fs por uma conexão com o banco de dados.', wait)
+
+
+# Literais trocados por '?' na forma normalizada dos comandos: blobs, strings e números
+_SQL_LITERALS = re.compile(r"[xX]'[0-9a-fA-F]*'|'(?:[^']|'')*'|(?<![\w.])\d+(?:\.\d+)?\b")
+# Listas de parâmetros, como em 'IN (?, ?, ?)', de qualquer tamanho
+_SQL_LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+
+
+def normalize_sql(sql: str) -> str:
+    '''
+    Retorna o comando sem os valores, para que execuções com parâmetros diferentes sejam agrupadas:
+    "SELECT * FROM user WHERE id = 3" e "SELECT * FROM user WHERE id = ?" viram o mesmo comando.
+    '''
+
+    sql = _SQL_LITERALS.sub('?', sql)
+    sql = _SQL_LISTS.sub('(...)', sql)
+    return ' '.join(sql.split())
+
+
+class QueryRecorder:
+    '''
+    Registra os comandos SQL de uma requisição, agrupados pela forma normalizada.
+    A contagem vem do trace callback do SQLite, que também vê os comandos dos gatilhos;
+    o tempo vem de 'InstrumentedConnection' e cobre a execução, sem a leitura das linhas restantes.
+    '''
+
+    def __init__(self) -> None:
+        # comando normalizado -> [execuções, segundos]
+        self.statements: dict[str, list] = {}
+
+    def trace(self, sql: str) -> None:
+        self.statements.setdefault(normalize_sql(sql), [0, 0.0])[0] += 1
+
+    def timed(self, sql: str, seconds: float) -> None:
+        self.statements.setdefault(normalize_sql(sql), [0, 0.0])[1] += seconds
+
+    @property
+    def count(self) -> int:
+        return sum(count for count, _ in self.statements.values())
+
+    @property
+    def seconds(self) -> float:
+        return sum(seconds for _, seconds in self.statements.values())
+
+    def repeated(self, threshold: int) -> dict[str, int]:
+        '''Retorna os comandos executados mais de 'threshold' vezes.'''
+        return {sql: count for sql, (count, _) in self.statements.items() if count > threshold}
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    '''Conexão que mede o tempo de cada comando quando há um 'recorder' associado.'''
+
+    recorder: QueryRecorder | None = None
+
+    def _timed(self, method, sql: str, *args):
+        if self.recorder is None:
+            return method(sql, *args)
+        start = time.perf_counter()
+        try:
+            return method(sql, *args)
+        finally:
+            self.recorder.timed(sql, time.perf_counter() - start)
+
+    def execute(self, sql: str, *args):
+        return self._timed(super().execute, sql, *args)
+
+    def executemany(self, sql: str, *args):
+        return self._timed(super().executemany, sql, *args)
+
+
+def connect(
+    path: str,
+    pragmas: dict[str, str | int] | None = None,
+    factory: type[Connection] = Connection
+) -> Connection:
+    '''Abre uma nova conexão com o banco de dados e aplica os 'pragmas' fornecidos.'''
+
+    # A conexão pode ser devolvida ao pool por uma thread e usada por outra
+    db = sqlite3.connect(
+        path,
+        detect_types = sqlite3.PARSE_DECLTYPES,
+        check_same_thread = False,
+        factory = factory
+    )
+    db.row_factory = sqlite3.Row
+
+    for name, value in (pragmas or {}).items():
+        if not name.isidentifier():
+            raise ValueError(f'Pragma inválido: {name!r}')
+        db.execute(f'PRAGMA {name} = {value}').fetchall()
+
+    return db
+
+
+class ThreadLocalConnection:
+    '''
+    Uma conexão por thread com um arquivo SQLite auxiliar (cache de fragmentos, limitador de requisições),
+    em modo autocommit e WAL. Chamar o objeto retorna a conexão da thread atual, criando-a se necessário.
+    '''
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._local = threading.local()
+
+    def __call__(self) -> Connection:
+
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout = 5, isolation_level = None)
+            db.execute('PRAGMA journal_mode = WAL')
+            db.execute('PRAGMA synchronous = NORMAL')
+            self._local.db = db
+        return db
+
+
+def run_maintenance(db: Connection) -> None:
+    '''
+    Executa, no máximo uma vez a cada intervalo configurado, as tarefas periódicas do SQLite:
+    'wal_checkpoint', que move as páginas do WAL para o banco e impede que o arquivo cresça sem limite,
+    e 'optimize', que atualiza as estatísticas usadas pelo planejador de consultas.
+    '''
+
+    state = current_app.extensions['db_maintenance']
+    now = time.monotonic()
+    tasks = {
+        'wal_checkpoint': ('PRAGMA wal_checkpoint(PASSIVE)', current_app.config['SQLITE_CHECKPOINT_INTERVAL']),
+        'optimize': ('PRAGMA optimize', current_app.config['SQLITE_OPTIMIZE_INTERVAL']),
+    }
+
+    for name, (command, interval) in tasks.items():
+        if interval is None:
+            continue
+        with state['lock']:
+            if now - state[name] < interval:
+                continue
+            state[name] = now
+        try:
+            db.execute(command).fetchall()
+        except sqlite3.OperationalError as e:
+            # O banco pode estar ocupado; a tarefa é tentada de novo no próximo intervalo
+            current_app.logger.warning('Falha ao executar %s: %s', command, e)
+
+
+def get_pool() -> ConnectionPool:
+    '''Retorna o pool de conexões do app atual.'''
+    return current_app.extensions['db_pool']
 
 
 def get_db() -> Connection:
     '''Retorna a conexão com o banco de dados.
-    Se ainda não houver uma conexão, cria uma.'''
+    Se ainda não houver uma conexão, pega uma do pool.'''
 
     if 'db' not in g:
-        g.db = sqlite3.connect(
-            current_app.config['DATABASE'],
-            detect_types = sqlite3.PARSE_DECLTYPES
-        )
-        g.db.row_factory = sqlite3.Row
+        g.db = get_pool().acquire()
+
+        # Com SQL_INSTRUMENTATION, os comandos de cada requisição são registrados para o Server-Timing
+        if isinstance(g.db, InstrumentedConnection) and has_request_context():
+            recorder = g.setdefault('sql_recorder', QueryRecorder())
+            g.db.recorder = recorder
+            g.db.set_trace_callback(recorder.trace)
 
     return g.db
 
+@contextmanager
+def transaction(immediate: bool = True) -> Iterator[Connection]:
+    '''
+    Agrupa todas as escritas feitas dentro do bloco, incluindo as de 'Model.save', em uma única transação,
+    confirmada uma única vez no fim do bloco ou desfeita se uma exceção for lançada.
+    Blocos aninhados usam savepoints: uma exceção desfaz apenas o bloco interno.
+
+    ```
+    with transaction() as db:
+        db.execute('UPDATE post SET like_count = like_count + 1 WHERE id = ?', (1,))
+        Like(1, 2).save()
+    ```
+
+    :param immediate: Se True, reserva a escrita no início da transação externa,
+        evitando o erro 'database is locked' ao promover uma leitura para escrita
+    '''
+
+    db = get_db()
+    depth = g.get('transaction_depth', 0)
+
+    if depth == 0:
+        if db.in_transaction:
+            db.commit()
+        db.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+    else:
+        db.execute(f'SAVEPOINT sp{depth}')
+
+    g.transaction_depth = depth + 1
+    try:
+        yield db
+    except BaseException:
+        # Os objetos carregados ou salvos dentro da transação podem não corresponder mais ao banco de dados
+        g.pop('identity_map', None)
+        if depth == 0:
+            db.rollback()
+        else:
+            db.execute(f'ROLLBACK TO sp{depth}')
+            db.execute(f'RELEASE sp{depth}')
+        raise
+    else:
+        if depth == 0:
+            db.commit()
+        else:
+            db.execute(f'RELEASE sp{depth}')
+    finally:
+        g.transaction_depth = depth
+
+def in_transaction() -> bool:
+    '''Retorna True se estiver dentro de um bloco 'transaction'.'''
+    return g.get('transaction_depth', 0) > 0
+
+def commit() -> None:
+    '''Confirma as escritas pendentes, a menos que estejam dentro de um bloco 'transaction', que confirma no fim.'''
+
+    if not in_transaction():
+        get_db().commit()
+
 def close_db(e = None) -> None:
-    '''Termina a conexão com o banco de dados caso esteja conectado.'''
+    '''Devolve a conexão com o banco de dados ao pool caso esteja conectado.'''
+
+    # Mapa de identidade dos modelos (ver 'blog.models'), válido apenas durante a requisição
+    g.pop('identity_map', None)
 
     db = g.pop('db', None)
     if db is not None:
-        db.close()
+        if isinstance(db, InstrumentedConnection):
+            db.recorder = None
+            db.set_trace_callback(None)
+        run_maintenance(db)
+        get_pool().release(db)
+
+
+def report_queries(response):
+    '''
+    Adiciona ao response o cabeçalho Server-Timing com a quantidade e o tempo dos comandos SQL da requisição,
+    registra uma linha de log em JSON e, se SQL_NPLUSONE_THRESHOLD for definido, avisa sobre comandos repetidos
+    (N+1), ou lança NPlusOneError se SQL_NPLUSONE_RAISE for True.
+    '''
+
+    recorder: QueryRecorder | None = g.get('sql_recorder')
+    if recorder is None:
+        return response
+
+    count, ms = recorder.count, recorder.seconds * 1000
+    response.headers.add('Server-Timing', f'db;dur={ms:.2f};desc="{count} queries"')
+
+    config = current_app.config
+    threshold = config['SQL_NPLUSONE_THRESHOLD']
+    repeated = recorder.repeated(threshold) if threshold is not None else {}
+
+    current_app.logger.info(json.dumps({
+        'event': 'sql',
+        'method': request.method,
+        'path': request.path,
+        'status': response.status_code,
+        'queries': count,
+        'sql_ms': round(ms, 2),
+        'repeated': repeated,
+    }))
+
+    for sql, times in repeated.items():
+        message = N_PLUS_ONE.format(times, request.path, sql)
+        if config['SQL_NPLUSONE_RAISE']:
+            raise NPlusOneError(message)
+        current_app.logger.warning(message)
+
+    return response
 
 
 def init_db():
@@ -35,11 +433,87 @@ def init_db():
     with current_app.open_resource('schema.sql') as f:
         db.executescript(f.read().decode('utf8'))
 
+    migrate()
+
+
+def get_migrations() -> list[tuple[int, str]]:
+    '''Retorna a versão e o nome de cada arquivo em 'migrations/', em ordem.'''
+
+    migrations = []
+    for name in os.listdir(os.path.join(current_app.root_path, 'migrations')):
+        match = re.fullmatch(r'(\d+)_\w+\.sql', name)
+        if match:
+            migrations.append((int(match.group(1)), name))
+    return sorted(migrations)
+
+
+def migrate() -> list[str]:
+    '''
+    Aplica, em ordem, as migrações que ainda não estão registradas em 'schema_version'
+    e retorna os nomes das que foram aplicadas. As migrações só avançam: não há como desfazê-las.
+    Cada migração roda em uma transação própria, junto com o seu registro.
+    '''
+
+    db = get_db()
+    db.execute(
+        'CREATE TABLE IF NOT EXISTS schema_version ('
+        '    version INTEGER PRIMARY KEY,'
+        '    name TEXT NOT NULL,'
+        '    applied TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP'
+        ')'
+    )
+    db.commit()
+    applied = {row[0] for row in db.execute('SELECT version FROM schema_version')}
+
+    names = []
+    for version, name in get_migrations():
+        if version in applied:
+            continue
+
+        with current_app.open_resource(os.path.join('migrations', name)) as f:
+            sql = f.read().decode('utf8')
+
+        # 'executescript' confirma a transação anterior antes de rodar, então o BEGIN/COMMIT fica no próprio script
+        try:
+            db.executescript(
+                f'BEGIN;\n{sql}\n;'
+                f'INSERT INTO schema_version (version, name) VALUES ({version}, {name!r});\n'
+                'COMMIT;'
+            )
+        except sqlite3.Error:
+            if db.in_transaction:
+                db.rollback()
+            raise
+        names.append(name)
+
+    return names
+
 @click.command('init-db')
 def init_db_command():
     init_db()
     click.echo(INIT_DB_MESSAGE)
 
+@click.command('migrate')
+@with_appcontext
+def migrate_command():
+    '''Aplica as migrações pendentes sem apagar os dados.'''
+
+    names = migrate()
+    for name in names:
+        click.echo(MIGRATION_APPLIED.format(name))
+    if not names:
+        click.echo(NO_PENDING_MIGRATIONS)
+
+@click.command('db-settings')
+@with_appcontext
+def db_settings_command():
+    '''Mostra os valores efetivos dos pragmas configurados em SQLITE_PRAGMAS.'''
+
+    db = get_db()
+    for name in current_app.config['SQLITE_PRAGMAS']:
+        value = db.execute(f'PRAGMA {name}').fetchone()
+        click.echo(f'{name} = {value[0] if value else None}')
+
 
 sqlite3.register_converter(
     'timestamp', lambda v: datetime.fromisoformat(v.decode())
@@ -47,8 +521,32 @@ sqlite3.register_converter(
 
 def init_app(app: Flask):
 
+    path = app.config['DATABASE']
+    pragmas = app.config['SQLITE_PRAGMAS']
+    factory = InstrumentedConnection if app.config['SQL_INSTRUMENTATION'] else Connection
+    app.extensions['db_pool'] = ConnectionPool(
+        lambda: connect(path, pragmas, factory),
+        max_size = app.config['DATABASE_POOL_SIZE'],
+        idle_timeout = app.config['DATABASE_POOL_IDLE_TIMEOUT'],
+        health_check = app.config['DATABASE_POOL_HEALTH_CHECK'],
+        timeout = app.config['DATABASE_POOL_TIMEOUT']
+    )
+    app.register_error_handler(PoolTimeoutError, lambda e: (str(e), 503))
+
+    # As tarefas periódicas só rodam depois de um intervalo completo
+    now = time.monotonic()
+    app.extensions['db_maintenance'] = {
+        'lock': threading.Lock(),
+        'wal_checkpoint': now,
+        'optimize': now,
+    }
+
     # O flask chama a função depois de retornar o response
     app.teardown_appcontext(close_db)
+    if app.config['SQL_INSTRUMENTATION']:
+        app.after_request(report_queries)
 
     # Adiciona um novo comando que pode ser chamado com o comando 'flask'
-    app.cli.add_command(init_db_command)
\ No newline at end of file
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(migrate_command)
+    app.cli.add_command(db_settings_command)
\ No newline at end of file
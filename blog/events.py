@@ -0,0 +1,226 @@
+import json
+import threading
+import time
+from collections import deque
+from typing import Iterator
+from flask import current_app, Flask
+
+
+class Subscriber:
+    '''
+    Conexão de um cliente com o hub. Em vez de uma fila de eventos, guarda apenas o estado mais recente
+    de cada post ainda não enviado, então um cliente lento recebe as alterações combinadas
+    e a memória usada não cresce com a quantidade de eventos.
+    Se passar de 'max_pending' posts pendentes, o cliente é marcado para recarregar o estado ('reset').
+    '''
+
+    def __init__(self, max_pending: int = 500) -> None:
+        self.max_pending = max_pending
+        self.last_id = 0
+        self.overflowed = False
+        self._pending: dict[int, dict] = {}
+        self._cond = threading.Condition()
+
+    def push(self, event_id: int, deltas: dict[int, dict]) -> None:
+
+        with self._cond:
+            if not self.overflowed:
+                for post_id, delta in deltas.items():
+                    self._pending.setdefault(post_id, {}).update(delta)
+                if len(self._pending) > self.max_pending:
+                    self.overflowed = True
+                    self._pending.clear()
+            self.last_id = event_id
+            self._cond.notify()
+
+    def reset(self) -> None:
+        '''Indica que o cliente perdeu eventos e precisa recarregar o estado.'''
+
+        with self._cond:
+            self.overflowed = True
+            self._pending.clear()
+            self._cond.notify()
+
+    def wait(self, timeout: float) -> tuple[int, dict[int, dict] | None] | None:
+        '''
+        Espera até 'timeout' segundos por alterações, sem ocupar a CPU.
+
+        :return: O id do último evento e as alterações, com None no lugar das alterações se o cliente
+        precisar recarregar o estado, ou None se nada mudou dentro do tempo
+        '''
+
+        with self._cond:
+            if not self._pending and not self.overflowed:
+                self._cond.wait(timeout)
+            if self.overflowed:
+                self.overflowed = False
+                return self.last_id, None
+            if not self._pending:
+                return None
+            pending, self._pending = self._pending, {}
+            return self.last_id, pending
+
+
+class EventHub:
+    '''
+    Publicação e assinatura de alterações dos posts dentro do processo.
+
+    As alterações publicadas dentro de uma janela de 'window' segundos são combinadas por post
+    e enviadas aos assinantes como um único evento. Os últimos 'history' eventos ficam guardados
+    para que um cliente que reconecta com 'Last-Event-ID' receba o que perdeu.
+    Apenas os clientes conectados ao mesmo processo recebem os eventos.
+
+    ```
+    hub.publish(1, likes = 3)
+    subscriber = hub.subscribe()
+    ```
+    '''
+
+    def __init__(self, window: float = 0.2, max_subscribers: int = 100, max_pending: int = 500, history: int = 100) -> None:
+        self.window = window
+        self.max_subscribers = max_subscribers
+        self.max_pending = max_pending
+
+        self._pending: dict[int, dict] = {}
+        self._subscribers: set[Subscriber] = set()
+        self._history: deque[tuple[int, dict[int, dict]]] = deque(maxlen = history)
+        self._last_id = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._closed = False
+
+    def publish(self, post_id: int, **delta) -> None:
+        '''Publica o novo estado de campos do post. Publicações do mesmo post na mesma janela são combinadas.'''
+
+        with self._lock:
+            self._pending.setdefault(post_id, {}).update(delta)
+            # O despacho só começa na primeira publicação
+            if self._thread is None:
+                self._thread = threading.Thread(target = self._run, name = 'event-hub', daemon = True)
+                self._thread.start()
+        self._wake.set()
+
+    def dispatch(self) -> None:
+        '''Envia as alterações combinadas aos assinantes como um único evento.'''
+
+        with self._lock:
+            if not self._pending:
+                return
+            deltas, self._pending = self._pending, {}
+            self._last_id += 1
+            event_id = self._last_id
+            self._history.append((event_id, deltas))
+            subscribers = list(self._subscribers)
+
+        for subscriber in subscribers:
+            subscriber.push(event_id, deltas)
+
+    def _run(self) -> None:
+        while not self._closed:
+            self._wake.wait()
+            self._wake.clear()
+            # Espera a janela para combinar as publicações que chegarem nesse intervalo
+            time.sleep(self.window)
+            self.dispatch()
+
+    def subscribe(self, last_event_id: int | None = None) -> Subscriber | None:
+        '''
+        Registra um assinante e, se 'last_event_id' for fornecido, entrega os eventos perdidos desde ele.
+        Retorna None se o limite de assinantes foi atingido.
+        '''
+
+        subscriber = Subscriber(self.max_pending)
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return None
+            self._subscribers.add(subscriber)
+            subscriber.last_id = self._last_id
+
+            if last_event_id is not None and last_event_id < self._last_id:
+                missed = [(id, deltas) for id, deltas in self._history if id > last_event_id]
+                if not missed or missed[0][0] != last_event_id + 1:
+                    # Os eventos perdidos já saíram do histórico
+                    subscriber.reset()
+                for id, deltas in missed:
+                    subscriber.push(id, deltas)
+
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def close(self) -> None:
+        self._closed = True
+        self._wake.set()
+
+
+def _format(event: str, data, event_id: int | None = None) -> str:
+    lines = [f'event: {event}', f'data: {json.dumps(data, separators = (",", ":"))}']
+    if event_id is not None:
+        lines.insert(0, f'id: {event_id}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def stream(
+    hub: EventHub,
+    subscriber: Subscriber,
+    heartbeat: float = 15,
+    max_idle: float = 60,
+    max_lifetime: float = 300,
+    retry: int = 5000
+) -> Iterator[str]:
+    '''
+    Gera a resposta text/event-stream de um assinante.
+
+    A conexão ocupa uma thread do servidor enquanto estiver aberta, então ela é encerrada depois
+    de 'max_idle' segundos sem eventos ou 'max_lifetime' segundos no total. O navegador reconecta
+    sozinho depois de 'retry' milissegundos, com 'Last-Event-ID', e recebe o que perdeu pelo histórico do hub.
+    Entre os eventos, envia um comentário a cada 'heartbeat' segundos para que proxies não fechem a conexão.
+    '''
+
+    try:
+        yield f'retry: {retry}\n\n'
+        start = last_event = time.monotonic()
+
+        while True:
+            now = time.monotonic()
+            if now - last_event >= max_idle or now - start >= max_lifetime:
+                return
+
+            result = subscriber.wait(min(heartbeat, max_idle - (now - last_event), max_lifetime - (now - start)))
+            if result is None:
+                yield ': heartbeat\n\n'
+                continue
+
+            last_event = time.monotonic()
+            event_id, deltas = result
+            if deltas is None:
+                yield _format('reset', {}, event_id)
+            else:
+                yield _format('posts', {str(post_id): delta for post_id, delta in deltas.items()}, event_id)
+    finally:
+        hub.unsubscribe(subscriber)
+
+
+def get_hub() -> EventHub:
+    '''Retorna o hub de eventos do app atual.'''
+    return current_app.extensions['event_hub']
+
+
+def publish(post_id: int, **delta) -> None:
+    '''Publica uma alteração do post para os clientes conectados em '/events'. Não faz nada se EVENTS_ENABLED for False.'''
+
+    if current_app.config['EVENTS_ENABLED']:
+        get_hub().publish(post_id, **delta)
+
+
+def init_app(app: Flask) -> None:
+
+    app.extensions['event_hub'] = EventHub(
+        window = app.config['EVENTS_COALESCE_WINDOW'],
+        max_subscribers = app.config['EVENTS_MAX_SUBSCRIBERS'],
+        max_pending = app.config['EVENTS_MAX_PENDING'],
+        history = app.config['EVENTS_HISTORY']
+    )
@@ -1 +1,13 @@
-class UserAlreadyRegisteredError(BaseException): ...
\ No newline at end of file
+class UserAlreadyRegisteredError(BaseException): ...
+
+
+class PoolTimeoutError(Exception):
+    '''Nenhuma conexão com o banco de dados ficou livre dentro do tempo limite.'''
+
+
+class HashingBusyError(Exception):
+    '''O serviço de hash de senhas não teve uma vaga livre dentro do tempo limite.'''
+
+
+class NPlusOneError(Exception):
+    '''Um mesmo comando SQL foi executado mais vezes que o limite em uma requisição.'''
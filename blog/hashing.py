@@ -0,0 +1,120 @@
+import atexit
+import multiprocessing
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor
+from flask import current_app, has_app_context, Flask
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from .exceptions import HashingBusyError
+from .messages import HASHING_BUSY
+
+
+class PasswordHasher:
+    '''
+    Calcula e verifica hashes de senha em um pool de processos, para que o scrypt não ocupe
+    o worker que atende a requisição nem dispute o GIL com as outras threads.
+
+    :param method: Método passado para 'generate_password_hash', com os parâmetros de custo (ex.: 'scrypt:32768:8:1')
+    :param workers: Processos do pool. Com 0, o hash é calculado no próprio processo
+    :param max_concurrency: Máximo de hashes em andamento ou na fila do pool
+    :param queue_timeout: Segundos esperando por uma vaga antes de lançar HashingBusyError
+    '''
+
+    def __init__(
+        self,
+        method: str = 'scrypt:32768:8:1',
+        workers: int = 2,
+        max_concurrency: int = 8,
+        queue_timeout: float = 5
+    ) -> None:
+        self.method = method
+        self.workers = workers
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._executor: Executor | None = None
+        self._lock = threading.Lock()
+        # (método, prefixo) do último 'method' usado em 'needs_rehash'
+        self._prefix: tuple[str, str] | None = None
+
+    def _get_executor(self) -> Executor:
+        '''Cria o pool no primeiro uso, para que processos que nunca calculam hashes não o iniciem.'''
+
+        with self._lock:
+            if self._executor is None:
+                # 'spawn' porque o processo do app já tem threads (pool de conexões, buffer de likes),
+                # e um fork poderia copiar um lock travado
+                self._executor = ProcessPoolExecutor(
+                    self.workers,
+                    mp_context = multiprocessing.get_context('spawn')
+                )
+            return self._executor
+
+    def _run(self, function, *args):
+
+        if not self._slots.acquire(timeout = self.queue_timeout):
+            raise HashingBusyError(HASHING_BUSY)
+        try:
+            if self.workers == 0:
+                return function(*args)
+            return self._get_executor().submit(function, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password: str) -> str:
+        '''Retorna o hash de 'password' com o método configurado.'''
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash: str, password: str) -> bool:
+        '''Verifica se 'password' corresponde a 'password_hash', qualquer que seja o método do hash.'''
+        return self._run(check_password_hash, password_hash, password)
+
+    def _method_prefix(self) -> str:
+        '''Retorna o início dos hashes gerados com o método configurado, como 'scrypt:32768:8:1'.'''
+
+        name, *params = self.method.split(':')
+        # Com todos os parâmetros no método, o prefixo é o próprio método
+        if (name == 'scrypt' and len(params) == 3) or (name == 'pbkdf2' and len(params) == 2):
+            return self.method
+        # Senão, o werkzeug completa os parâmetros omitidos, e o prefixo vem de um hash real, calculado no pool
+        return self._run(generate_password_hash, '', self.method).partition('$')[0]
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        '''Retorna se 'password_hash' foi gerado com parâmetros diferentes dos configurados.'''
+
+        if self._prefix is None or self._prefix[0] != self.method:
+            self._prefix = (self.method, self._method_prefix())
+        return password_hash.partition('$')[0] != self._prefix[1]
+
+    def close(self) -> None:
+        '''Encerra os processos do pool.'''
+
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+
+def get_hasher() -> PasswordHasher:
+    '''Retorna o serviço de hash de senhas do app atual.'''
+    return current_app.extensions['password_hasher']
+
+
+def hash_password(password: str) -> str:
+    '''Calcula o hash de 'password' pelo pool do app atual ou, fora de um contexto do app, no próprio processo.'''
+
+    if has_app_context() and 'password_hasher' in current_app.extensions:
+        return get_hasher().hash(password)
+    return generate_password_hash(password)
+
+
+def init_app(app: Flask) -> None:
+
+    hasher = PasswordHasher(
+        method = app.config['PASSWORD_HASH_METHOD'],
+        workers = app.config['PASSWORD_HASH_WORKERS'],
+        max_concurrency = app.config['PASSWORD_HASH_MAX_CONCURRENCY'],
+        queue_timeout = app.config['PASSWORD_HASH_QUEUE_TIMEOUT']
+    )
+    app.extensions['password_hasher'] = hasher
+    app.register_error_handler(HashingBusyError, lambda e: (str(e), 503))
+    atexit.register(hasher.close)
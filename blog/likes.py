@@ -0,0 +1,246 @@
+import atexit
+import threading
+from flask import current_app, Flask
+
+from .cache import get_cache, bump_feed
+from .db import get_db, transaction
+from .models import Post, Like
+
+
+class LikeBuffer:
+    '''
+    Guarda os likes em memória e os grava no banco de dados em lotes (write-behind),
+    a cada 'interval' milissegundos ou quando 'max_events' eventos se acumulam.
+    Assim, vários cliques em um post popular custam uma única transação,
+    em vez de uma escrita com commit por clique.
+
+    As leituras devem combinar o valor do banco com o que ainda está pendente, usando 'merge'.
+    O buffer pertence a um processo: os outros workers só veem os likes depois que eles são gravados.
+    '''
+
+    def __init__(self, app: Flask, interval: int = 500, max_events: int = 100) -> None:
+        self.app = app
+        self.interval = interval
+        self.max_events = max_events
+
+        # (post_id, user_id) -> estado final desejado; post_id -> diferença em like_count
+        self._pending: dict[tuple[int, int], bool] = {}
+        self._deltas: dict[int, int] = {}
+        # Eventos sendo gravados, visíveis para as leituras até o commit da gravação
+        self._flushing: dict[tuple[int, int], bool] = {}
+        self._flushing_deltas: dict[int, int] = {}
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._events = 0
+        self._thread = threading.Thread(target = self._run, name = 'like-buffer', daemon = True)
+        self._thread.start()
+
+    def _state(self, key: tuple[int, int]) -> bool | None:
+        '''Retorna o estado pendente do like, ou None se não houver eventos pendentes.'''
+
+        if key in self._pending:
+            return self._pending[key]
+        return self._flushing.get(key)
+
+    def _delta(self, post_id: int) -> int:
+        return self._deltas.get(post_id, 0) + self._flushing_deltas.get(post_id, 0)
+
+    def toggle(self, post_id: int, user_id: int, liked: bool | None = None) -> tuple[bool, int]:
+        '''
+        Altera o like de 'user_id' em 'post_id' para 'liked' (ou inverte, se 'liked' for None)
+        e retorna o novo estado e a contagem combinada.
+        '''
+
+        key = (post_id, user_id)
+        with self._lock:
+            current = self._state(key)
+        if current is None:
+            current = Like.get(post_id = post_id, user_id = user_id) is not None
+
+        with self._lock:
+            # Lido sob o lock, para que a contagem e os eventos em gravação venham do mesmo lado do commit
+            stored = get_db().execute(
+                'SELECT like_count FROM post WHERE id = ?',
+                (post_id,)
+            ).fetchone()[0]
+            # Outro evento do mesmo usuário pode ter chegado durante a leitura
+            pending = self._state(key)
+            if pending is not None:
+                current = pending
+            desired = not current if liked is None else liked
+            if desired != current:
+                self._pending[key] = desired
+                self._deltas[post_id] = self._deltas.get(post_id, 0) + (1 if desired else -1)
+                self._events += 1
+                if self._events >= self.max_events:
+                    self._wake.set()
+            like_count = stored + self._delta(post_id)
+
+        return desired, like_count
+
+    def merge(self, posts: list[Post], user_id: int | None = None) -> list[Post]:
+        '''Aplica aos posts os likes ainda não gravados, na contagem e, se 'user_id' for fornecido, no estado de curtido.'''
+
+        with self._lock:
+            for post in posts:
+                post.like_count += self._delta(post.id)
+                if user_id is not None:
+                    liked = self._state((post.id, user_id))
+                    if liked is not None:
+                        post._liked = (user_id, liked)
+        return posts
+
+    def flush(self) -> None:
+        '''Grava os eventos pendentes em uma única transação.'''
+
+        with self._flush_lock:
+
+            with self._lock:
+                if not self._pending:
+                    return
+                self._flushing, self._pending = self._pending, {}
+                self._flushing_deltas, self._deltas = self._deltas, {}
+                self._events = 0
+
+            try:
+                with self.app.app_context():
+                    changed = self._write(self._flushing)
+                    # Só depois que os eventos gravados deixaram de ser somados às leituras,
+                    # senão um fragmento renderizado agora guardaria a contagem em dobro
+                    cache = get_cache()
+                    for post_id in changed:
+                        cache.invalidate('post', post_id)
+                    if changed:
+                        bump_feed()
+            except Exception:
+                # Devolve os eventos ao buffer para a próxima tentativa, sem sobrescrever os mais novos
+                self.app.logger.exception('Falha ao gravar os likes pendentes.')
+                with self._lock:
+                    for key, liked in self._flushing.items():
+                        self._pending.setdefault(key, liked)
+                    for post_id, delta in self._flushing_deltas.items():
+                        self._deltas[post_id] = self._deltas.get(post_id, 0) + delta
+                    self._flushing, self._flushing_deltas = {}, {}
+                raise
+
+    def _write(self, events: dict[tuple[int, int], bool]) -> dict[int, int]:
+        '''
+        Aplica os eventos nas tabelas like e post e retorna a diferença real em like_count de cada post.
+        A diferença vem das linhas realmente alteradas, então a contagem continua consistente com a tabela like
+        mesmo que outro processo tenha gravado o mesmo like.
+        '''
+
+        changed: dict[int, int] = {}
+        with transaction() as db:
+            for (post_id, user_id), liked in events.items():
+                if liked:
+                    rowcount = db.execute(
+                        'INSERT OR IGNORE INTO like (post_id, user_id) VALUES (?,?)',
+                        (post_id, user_id)
+                    ).rowcount
+                else:
+                    rowcount = -db.execute(
+                        'DELETE FROM like WHERE post_id = ? AND user_id = ?',
+                        (post_id, user_id)
+                    ).rowcount
+                if rowcount:
+                    changed[post_id] = changed.get(post_id, 0) + rowcount
+
+            db.executemany(
+                'UPDATE post SET like_count = like_count + ? WHERE id = ?',
+                [(delta, post_id) for post_id, delta in changed.items() if delta]
+            )
+
+            # O commit e a remoção dos eventos gravados acontecem sob o mesmo lock: uma leitura vê a contagem
+            # antiga somada aos eventos ou a nova sem eles, nunca a nova somada aos eventos
+            with self._lock:
+                db.commit()
+                self._flushing, self._flushing_deltas = {}, {}
+        return changed
+
+    def _run(self) -> None:
+        while not self._closed:
+            self._wake.wait(self.interval / 1000)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                # O erro já foi registrado e os eventos continuam pendentes
+                pass
+
+    def close(self) -> None:
+        '''Para a gravação periódica e grava os eventos que ainda estão pendentes.'''
+
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+
+
+def set_likes(user_id: int, states: dict[int, bool | None]) -> dict[int, tuple[bool, int]]:
+    '''
+    Altera os likes de 'user_id' em uma única transação. Cada post recebe o estado pedido,
+    ou tem o like invertido se o estado for None.
+
+    Cada post custa no máximo três comandos: o DELETE ... RETURNING diz se havia um like,
+    o INSERT ... ON CONFLICT só grava se não havia, e o UPDATE ... RETURNING ajusta e lê a contagem.
+    Como a transação reserva a escrita, cliques simultâneos não contam o mesmo like duas vezes.
+
+    :return: O novo estado e a contagem de cada post. Posts que não existem ficam de fora
+    '''
+
+    results = {}
+    with transaction() as db:
+        for post_id, liked in states.items():
+
+            removed = liked is not True and db.execute(
+                'DELETE FROM like WHERE post_id = ? AND user_id = ? RETURNING id',
+                (post_id, user_id)
+            ).fetchone() is not None
+
+            if removed:
+                liked, delta = False, -1
+            elif liked is False:
+                delta = 0
+            else:
+                # O SELECT impede um like em um post que não existe
+                inserted = db.execute(
+                    'INSERT INTO like (post_id, user_id) SELECT ?, ? WHERE EXISTS (SELECT 1 FROM post WHERE id = ?) '
+                    'ON CONFLICT DO NOTHING RETURNING id',
+                    (post_id, user_id, post_id)
+                ).fetchone() is not None
+                liked, delta = True, int(inserted)
+
+            row = db.execute(
+                'UPDATE post SET like_count = like_count + ? WHERE id = ? RETURNING like_count',
+                (delta, post_id)
+            ).fetchone()
+            if row is not None:
+                results[post_id] = (liked, row[0])
+
+    return results
+
+
+def get_buffer() -> LikeBuffer | None:
+    '''Retorna o buffer de likes do app atual, ou None se o modo write-behind estiver desativado.'''
+    return current_app.extensions.get('like_buffer')
+
+
+def init_app(app: Flask) -> None:
+
+    if not app.config['LIKE_WRITE_BEHIND']:
+        return
+
+    buffer = LikeBuffer(
+        app,
+        interval = app.config['LIKE_FLUSH_INTERVAL'],
+        max_events = app.config['LIKE_FLUSH_EVENTS']
+    )
+    app.extensions['like_buffer'] = buffer
+    # Garante que nenhum like pendente seja perdido ao encerrar o processo
+    atexit.register(buffer.close)
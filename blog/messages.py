@@ -9,5 +9,17 @@ POST_NAO_EXISTE = 'Post não existe.'
 FORBIDDEN = 'Você não tem acesso a esta página.'
 SEM_TITULO = 'A postagem deve ter um título.'
 SEM_BODY = 'A postagem deve ter conteúdo.'
+CURSOR_INVALIDO = 'Cursor de paginação inválido.'
+LIKES_INVALIDOS = 'Lista de likes inválida.'
+EVENTS_FULL = 'Muitas conexões de atualização abertas. Tente novamente mais tarde.'
 
-INIT_DB_MESSAGE = 'Banco de dados inicializado.'
\ No newline at end of file
+INIT_DB_MESSAGE = 'Banco de dados inicializado.'
+MIGRATION_APPLIED = 'Migração aplicada: {}'
+NO_PENDING_MIGRATIONS = 'O banco de dados já está atualizado.'
+SEARCH_REBUILT = 'Índice de busca recriado com {} linhas.'
+NO_PROFILES = 'Nenhum perfil encontrado.'
+ASSETS_BUILT = 'Arquivos estáticos gerados: {} pacotes de CSS e {} arquivos.'
+RATE_LIMITED = 'Muitas requisições. Tente novamente em alguns segundos.'
+HASHING_BUSY = 'Servidor ocupado, tente entrar novamente em alguns segundos.'
+N_PLUS_ONE = 'Possível N+1: comando executado {} vezes em {}: {}'
+POOL_TIMEOUT = 'Tempo esgotado esperando por uma conexão com o banco de dados.'
\ No newline at end of file
@@ -0,0 +1,2 @@
+-- Usado por Post.replies e Post.prefetch('replies') em toda renderização do feed
+CREATE INDEX IF NOT EXISTS idx_reply_post_id ON reply (post_id);
@@ -0,0 +1,2 @@
+-- Usado ao buscar os posts de um usuário (Post.filter(user = ...))
+CREATE INDEX IF NOT EXISTS idx_post_user_id ON post (user_id);
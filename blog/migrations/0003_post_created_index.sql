@@ -0,0 +1,2 @@
+-- Ordenação e paginação por cursor do feed (Post.get_page)
+CREATE INDEX IF NOT EXISTS idx_post_created_id ON post (created, id);
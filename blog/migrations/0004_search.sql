@@ -0,0 +1,39 @@
+-- Índice de busca textual de posts e respostas.
+-- O rowid identifica a origem: posts usam id * 2 e respostas id * 2 + 1,
+-- assim os gatilhos removem as linhas pelo rowid, sem percorrer o índice.
+CREATE VIRTUAL TABLE IF NOT EXISTS search USING fts5(
+    title,
+    body,
+    post_id UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER IF NOT EXISTS search_post_insert AFTER INSERT ON post BEGIN
+    INSERT INTO search (rowid, title, body, post_id) VALUES (new.id * 2, new.title, new.body, new.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS search_post_update AFTER UPDATE OF title, body ON post BEGIN
+    DELETE FROM search WHERE rowid = old.id * 2;
+    INSERT INTO search (rowid, title, body, post_id) VALUES (new.id * 2, new.title, new.body, new.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS search_post_delete AFTER DELETE ON post BEGIN
+    DELETE FROM search WHERE rowid = old.id * 2;
+    DELETE FROM search WHERE rowid IN (SELECT id * 2 + 1 FROM reply WHERE post_id = old.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS search_reply_insert AFTER INSERT ON reply BEGIN
+    INSERT INTO search (rowid, title, body, post_id) VALUES (new.id * 2 + 1, '', new.body, new.post_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS search_reply_update AFTER UPDATE OF body ON reply BEGIN
+    DELETE FROM search WHERE rowid = old.id * 2 + 1;
+    INSERT INTO search (rowid, title, body, post_id) VALUES (new.id * 2 + 1, '', new.body, new.post_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS search_reply_delete AFTER DELETE ON reply BEGIN
+    DELETE FROM search WHERE rowid = old.id * 2 + 1;
+END;
+
+INSERT OR REPLACE INTO search (rowid, title, body, post_id) SELECT id * 2, title, body, id FROM post;
+INSERT OR REPLACE INTO search (rowid, title, body, post_id) SELECT id * 2 + 1, '', body, post_id FROM reply;
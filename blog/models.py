@@ -1,41 +1,268 @@
-from flask import g, abort
-from werkzeug.security import generate_password_hash, check_password_hash
-from .db import get_db
+from flask import g, abort, has_app_context
+from werkzeug.security import check_password_hash
+from .db import get_db, commit, transaction
+from .hashing import hash_password
 from abc import ABC, abstractmethod
-from typing import Self, Union, overload, Any
+from typing import Self, Union, overload, Any, Sequence
 from .messages import FORBIDDEN, POST_NAO_EXISTE
 import sqlite3
 
 
 
-def _get_conditions_sql(kwargs: dict):
-    values = []
-    for k in kwargs:
-        values.append(f'{k} = ?')
-    return ' AND '.join(values)
+def _id_of(value: "ModelType | int") -> int:
+    '''Retorna o id de um objeto ou o próprio valor, se já for um id, sem consultar o banco de dados.'''
+    return value.id if isinstance(value, Model) else value
+
+def _identity_map() -> dict[tuple[str, int], "Model"] | None:
+    '''
+    Retorna o mapa de identidade da requisição atual, que guarda os objetos já carregados por (tabela, id).
+    Fora de um contexto do app não há mapa, e os objetos são sempre lidos do banco de dados.
+    '''
+
+    if not has_app_context():
+        return None
+    return g.setdefault('identity_map', {})
+
+def _chunks(values: Sequence[Any], size: int = 500):
+    '''Divide 'values' em partes de até 'size' itens, respeitando o limite de parâmetros do SQLite.'''
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+def _check_column(column: str) -> str:
+    if not column.isidentifier():
+        raise ValueError(f'Coluna inválida: {column!r}')
+    return column
+
+class QuerySet:
+    """
+    Consulta preguiçosa de um modelo: cada método retorna uma nova consulta,
+    e o SQL só é executado quando os objetos são pedidos ('all', 'first', 'iterator', iteração)
+    ou por 'count' e 'exists', que são calculados pelo próprio banco de dados.
+
+    ```
+    posts = Post.query.filter(user = user).order_by('-created').limit(20).only('id', 'title')
+    for post in Post.query.iterator(chunk_size = 1000):
+        ...
+    ```
+    """
+
+    def __init__(self, model: type["Model"]) -> None:
+        self.model = model
+        self._where: tuple[str, ...] = ()
+        self._params: tuple[Any, ...] = ()
+        self._order: tuple[tuple[str, bool], ...] = ()
+        self._limit: int | None = None
+        self._offset: int | None = None
+        self._fields: tuple[str, ...] | None = None
+
+    def _clone(self, **changes) -> "QuerySet":
+        clone = QuerySet.__new__(QuerySet)
+        clone.__dict__.update(self.__dict__)
+        for name, value in changes.items():
+            setattr(clone, f'_{name}', value)
+        return clone
+
+    def filter(self, **kwargs) -> "QuerySet":
+        """Adiciona condições de igualdade. Objetos são trocados pelo id, na coluna '<nome>_id'."""
+
+        where, params = [], []
+        for k, v in kwargs.items():
+            if isinstance(v, Model):
+                k, v = f'{k}_id', v.id
+            where.append(f'{_check_column(k)} = ?')
+            params.append(v)
+        return self._clone(where = self._where + tuple(where), params = self._params + tuple(params))
+
+    def order_by(self, *columns: str) -> "QuerySet":
+        """Define a ordenação. Colunas prefixadas com '-' são ordenadas de forma decrescente."""
+
+        order = tuple(
+            (_check_column(column.lstrip('-')), column.startswith('-'))
+            for column in columns
+        )
+        return self._clone(order = order)
+
+    def after(self, *values: Any) -> "QuerySet":
+        """
+        Retorna apenas as linhas que vêm depois da chave 'values' na ordenação atual (paginação por cursor),
+        sem que o banco precise percorrer as anteriores. Todas as colunas da ordenação devem ter a mesma direção.
+        """
+
+        directions = {descending for _, descending in self._order}
+        if len(directions) != 1:
+            raise ValueError('after exige uma ordenação com todas as colunas na mesma direção.')
+        if len(values) != len(self._order):
+            raise ValueError('after deve ter um valor para cada coluna de order_by.')
+
+        columns = ', '.join(column for column, _ in self._order)
+        placeholders = ', '.join('?' for _ in values)
+        condition = f'({columns}) {"<" if directions.pop() else ">"} ({placeholders})'
+        return self._clone(where = self._where + (condition,), params = self._params + values)
+
+    def limit(self, limit: int | None) -> "QuerySet":
+        return self._clone(limit = limit)
+
+    def offset(self, offset: int | None) -> "QuerySet":
+        return self._clone(offset = offset)
+
+    def only(self, *fields: str) -> "QuerySet":
+        """
+        Carrega apenas as colunas fornecidas. Os objetos ficam incompletos:
+        acessar um atributo não carregado lança AttributeError, e eles não entram no mapa de identidade.
+        """
+
+        for field in fields:
+            if field not in self.model.columns:
+                raise ValueError(f'{self.model.__name__} não tem a coluna {field!r}')
+        return self._clone(fields = fields)
+
+    def _sql(self, select: str) -> tuple[str, list[Any]]:
+
+        command = f'SELECT {select} FROM {self.model.table}'
+        params = list(self._params)
+        if self._where:
+            command += ' WHERE ' + ' AND '.join(self._where)
+        if self._order:
+            command += ' ORDER BY ' + ', '.join(
+                f'{column} {"DESC" if descending else "ASC"}' for column, descending in self._order
+            )
+        if self._limit is not None or self._offset is not None:
+            command += ' LIMIT ? OFFSET ?'
+            params.extend((-1 if self._limit is None else self._limit, self._offset or 0))
+        return command, params
+
+    def _hydrate(self, row: sqlite3.Row, identify: bool = True) -> "Model":
+
+        if self._fields is None:
+            obj = self.model.from_row(row)
+            return obj._identify() if identify else obj
+
+        obj = self.model.__new__(self.model)
+        for field, value in zip(self._fields, row):
+            setattr(obj, self.model.columns[field], value)
+        return obj
+
+    def iterator(self, chunk_size: int = 1000):
+        """
+        Percorre os objetos lendo 'chunk_size' linhas por vez do cursor,
+        então a memória usada não depende da quantidade de linhas.
+        Por isso os objetos não entram no mapa de identidade, que os manteria até o fim da requisição.
+        """
+
+        select = '*' if self._fields is None else ', '.join(self._fields)
+        cursor = get_db().execute(*self._sql(select))
+        try:
+            while rows := cursor.fetchmany(chunk_size):
+                for row in rows:
+                    yield self._hydrate(row, identify = False)
+        finally:
+            cursor.close()
+
+    def __iter__(self):
+        return iter(self.all())
+
+    def all(self) -> list["Model"]:
+        select = '*' if self._fields is None else ', '.join(self._fields)
+        rows = get_db().execute(*self._sql(select)).fetchall()
+        return [self._hydrate(row) for row in rows]
+
+    def first(self) -> "Model | None":
+        objs = self.limit(1).all()
+        return objs[0] if objs else None
+
+    def count(self) -> int:
+        """Retorna a quantidade de linhas com um COUNT(*) no banco de dados, sem carregar os objetos."""
+
+        if self._limit is None and self._offset is None:
+            command, params = self._clone(order = ())._sql('COUNT(*)')
+        else:
+            command, params = self._sql('1')
+            command = f'SELECT COUNT(*) FROM ({command})'
+        return get_db().execute(command, params).fetchone()[0]
+
+    def exists(self) -> bool:
+        """Retorna True se existe ao menos uma linha, parando na primeira encontrada."""
+
+        command, params = self._clone(order = ())._sql('1')
+        return get_db().execute(f'SELECT EXISTS ({command})', params).fetchone()[0] == 1
+
+
+class _QueryDescriptor:
+    """Faz 'Model.query' retornar uma nova consulta sobre o modelo."""
+
+    def __get__(self, obj, cls: type["Model"]) -> QuerySet:
+        return QuerySet(cls)
 
 class Model(ABC):
 
+    # Os modelos não têm __dict__: cada subclasse declara seus atributos em __slots__,
+    # o que reduz a memória e acelera o acesso aos atributos quando muitas linhas são carregadas
+    __slots__ = ()
+
+    # Relações que podem ser carregadas em lote por 'prefetch':
+    # nome -> (nome do modelo relacionado, atributo que guarda o resultado, coluna da chave estrangeira no modelo relacionado).
+    # Se a coluna for None, a chave estrangeira está no próprio objeto, guardada no atributo.
+    relations: dict[str, tuple[str, str, str | None]] = {}
+    _models: dict[str, type["Model"]] = {}
+    # Coluna da tabela -> atributo do objeto, na ordem de 'SELECT *'
+    columns: dict[str, str] = {}
+    query = _QueryDescriptor()
+
     def __init_subclass__(cls):
         cls.table = cls.__name__.lower()
+        Model._models[cls.__name__] = cls
+
+    @classmethod
+    @abstractmethod
+    def from_row(cls, row: sqlite3.Row) -> Self:
+        """
+        Cria o objeto a partir de uma linha de 'SELECT *' da tabela, sem passar pelo __init__.
+        É o caminho usado sempre que objetos são carregados do banco de dados.
+        """
+        ...
 
     @classmethod
     def _get(cls, **kwargs) -> Self | None:
 
-        columns = {}
-        for k,v in kwargs.items():
-            if isinstance(v, ModelType):
-                columns[f'{k}_id'] = v.id
-            else:
-                columns[k] = v
+        # Um objeto buscado pelo id pode já ter sido carregado nesta requisição
+        if kwargs.keys() == {'id'}:
+            obj = cls._identified(kwargs['id'])
+            if obj is not None:
+                return obj
 
-        db = get_db()
-        command = f'SELECT * FROM {cls.table} WHERE ' + _get_conditions_sql(columns)
-        obj = db.execute(
-            command, tuple(columns.values())
-        ).fetchone()
+        return cls.query.filter(**kwargs).first()
+
+    @classmethod
+    def _identified(cls, id: int) -> Self | None:
+        '''Retorna o objeto com o id fornecido se ele já foi carregado nesta requisição.'''
+
+        identity_map = _identity_map()
+        if identity_map is None:
+            return None
+        return identity_map.get((cls.table, id))
+
+    def _identify(self) -> Self:
+        '''
+        Registra o objeto no mapa de identidade da requisição.
+        Se outro objeto com o mesmo id já foi carregado, retorna esse objeto,
+        para que cada linha seja representada por uma única instância.
+        '''
+
+        identity_map = _identity_map()
+        if identity_map is None or self.id is None:
+            return self
+        return identity_map.setdefault((self.table, self.id), self)
 
-        return cls(*obj) if obj else None
+    @classmethod
+    def forget(cls, id: int) -> None:
+        """
+        Remove o objeto do mapa de identidade da requisição.
+        Deve ser chamado depois de escritas que alteram a linha sem passar pelo objeto.
+        """
+
+        identity_map = _identity_map()
+        if identity_map is not None:
+            identity_map.pop((cls.table, id), None)
     
     @classmethod
     def get(cls, **kwargs) -> Self | None:
@@ -61,26 +288,128 @@ class Model(ABC):
         ```
         """
 
-        return get_db().execute(
-            f'SELECT * FROM {cls.table} WHERE ' + _get_conditions_sql(kwargs),
-            tuple(kwargs.values())
-        ).fetchall()
+        return cls.query.filter(**kwargs).all()
     
     @classmethod
     def get_all(cls) -> list[Self]:
         """Retorna uma lista de objetos correspondente a todas linhas da tabela."""
         
-        all = get_db().execute(
-            f'SELECT * FROM {cls.__name__.lower()}'
-        ).fetchall()
-        return [cls(**kwargs) for kwargs in all]
+        return cls.query.all()
+    
+    @classmethod
+    def get_ordered(
+        cls,
+        order_by: Sequence[str],
+        limit: int | None = None,
+        after: Sequence[Any] | None = None,
+        **kwargs
+    ) -> list[Self]:
+        """
+        Atalho para 'Model.query' que retorna os objetos que satisfazem as condições,
+        ordenados por 'order_by' e limitados a 'limit' linhas.
+        Colunas prefixadas com '-' são ordenadas de forma decrescente.
+        Se 'after' for fornecido, retorna apenas as linhas que vêm depois dessa chave na ordenação
+        (paginação por cursor), sem que o banco precise percorrer as anteriores.
+
+        ```
+        posts = Post.get_ordered(('-created', '-id'), limit = 20)
+        older = Post.get_ordered(('-created', '-id'), limit = 20, after = (posts[-1].created, posts[-1].id))
+        ```
+        """
+
+        query = cls.query.filter(**kwargs).order_by(*order_by).limit(limit)
+        if after is not None:
+            query = query.after(*after)
+        return query.all()
 
     
+    @classmethod
+    def prefetch(cls, objs: list[Self], *relations: str) -> list[Self]:
+        """
+        Carrega as relações de todos os objetos de 'objs' com uma consulta 'IN (...)' por relação,
+        em vez de uma consulta por objeto. Relações aninhadas são separadas por '__'.
+
+        ```
+        posts = Post.prefetch(posts, 'user', 'replies__user')
+        ```
+        """
+
+        for relation in relations:
+            name, _, rest = relation.partition('__')
+            if name not in cls.relations:
+                raise ValueError(f'{cls.__name__} não tem a relação {name!r}')
+
+            model_name, attr, column = cls.relations[name]
+            model = Model._models[model_name]
+
+            if column is None:
+                related = cls._prefetch_forward(objs, model, attr)
+            else:
+                related = cls._prefetch_reverse(objs, model, attr, column)
+
+            if rest:
+                model.prefetch(related, rest)
+
+        return objs
+
+    @staticmethod
+    def _prefetch_forward(objs: list["Model"], model: type["Model"], attr: str) -> list["Model"]:
+        '''Carrega o objeto referenciado pela chave estrangeira guardada em 'attr' de cada objeto.'''
+
+        loaded = {}
+        for obj in objs:
+            value = getattr(obj, attr)
+            if not isinstance(value, model) and value not in loaded:
+                identified = model._identified(value)
+                if identified is not None:
+                    loaded[value] = identified
+
+        ids = list({
+            getattr(obj, attr) for obj in objs
+            if not isinstance(getattr(obj, attr), model)
+        } - loaded.keys())
+
+        db = get_db()
+        for chunk in _chunks(ids):
+            rows = db.execute(
+                f'SELECT * FROM {model.table} WHERE id IN ({", ".join("?" for _ in chunk)})',
+                tuple(chunk)
+            ).fetchall()
+            loaded.update((row['id'], model.from_row(row)._identify()) for row in rows)
+
+        related = []
+        for obj in objs:
+            value = getattr(obj, attr)
+            if not isinstance(value, model):
+                value = loaded.get(value, value)
+                setattr(obj, attr, value)
+            related.append(value)
+        return related
+
+    @staticmethod
+    def _prefetch_reverse(objs: list["Model"], model: type["Model"], attr: str, column: str) -> list["Model"]:
+        '''Carrega, para cada objeto, a lista de objetos de 'model' cuja coluna 'column' o referencia.'''
+
+        grouped = {obj.id: [] for obj in objs}
+        db = get_db()
+        for chunk in _chunks(list(grouped)):
+            rows = db.execute(
+                f'SELECT * FROM {model.table} WHERE {column} IN ({", ".join("?" for _ in chunk)}) ORDER BY id',
+                tuple(chunk)
+            ).fetchall()
+            for row in rows:
+                grouped[row[column]].append(model.from_row(row)._identify())
+
+        for obj in objs:
+            setattr(obj, attr, grouped[obj.id])
+        return [related for group in grouped.values() for related in group]
+
     @classmethod
     def _create_and_save(cls, **kwargs) -> Self:
 
         obj = cls(**kwargs)
-        return obj.save()
+        obj.save()
+        return obj
         
 
     @classmethod
@@ -108,10 +437,87 @@ class Model(ABC):
         """Salva no banco de dados."""
         ...
 
+    # Colunas gravadas por 'bulk_create', na ordem de '_insert_values'
+    insert_columns: tuple[str, ...] = ()
+
+    @abstractmethod
+    def _insert_values(self) -> tuple[Any, ...]:
+        '''Retorna os valores de 'insert_columns' para este objeto.'''
+        ...
+
+    @classmethod
+    def bulk_create(cls, objs: Sequence[Self], batch_size: int = 1000) -> list[int]:
+        """
+        Insere todos os objetos em uma única transação, com um 'executemany' a cada 'batch_size' objetos,
+        e retorna os ids atribuídos, na mesma ordem. Os objetos recebem o id, mas não os valores
+        padrão gerados pelo banco de dados (como 'created').
+
+        ```
+        ids = Post.bulk_create([Post(title, body, user) for title, body in rows])
+        ```
+        """
+
+        command = (
+            f'INSERT INTO {cls.table} ({", ".join(cls.insert_columns)}) '
+            f'VALUES ({", ".join("?" for _ in cls.insert_columns)})'
+        )
+
+        objs = list(objs)
+        ids = []
+        with transaction() as db:
+            for chunk in _chunks(objs, batch_size):
+                db.executemany(command, [obj._insert_values() for obj in chunk])
+                # A transação reserva a escrita e a tabela usa AUTOINCREMENT,
+                # então os ids do lote são consecutivos e terminam no último inserido
+                last = db.execute('SELECT last_insert_rowid()').fetchone()[0]
+                ids.extend(range(last - len(chunk) + 1, last + 1))
+            cls._after_bulk_create(objs)
+
+        for obj, id in zip(objs, ids):
+            obj.id = id
+        return ids
+
+    @classmethod
+    def _after_bulk_create(cls, objs: Sequence[Self]) -> None:
+        '''Chamado dentro da transação de 'bulk_create', para manter dados derivados consistentes.'''
+
+    @classmethod
+    def bulk_delete(cls, ids: Sequence[int], batch_size: int = 500) -> int:
+        """
+        Apaga as linhas com os ids fornecidos em uma única transação e retorna quantas foram apagadas.
+
+        ```
+        Like.bulk_delete([like.id for like in likes])
+        ```
+        """
+
+        ids = list(ids)
+        deleted = 0
+        with transaction() as db:
+            for chunk in _chunks(ids, batch_size):
+                placeholders = ', '.join('?' for _ in chunk)
+                cls._before_bulk_delete(chunk, placeholders)
+                deleted += db.execute(
+                    f'DELETE FROM {cls.table} WHERE id IN ({placeholders})',
+                    chunk
+                ).rowcount
+
+        for id in ids:
+            cls.forget(id)
+        return deleted
+
+    @classmethod
+    def _before_bulk_delete(cls, ids: Sequence[int], placeholders: str) -> None:
+        '''Chamado dentro da transação de 'bulk_delete', antes de apagar cada lote.'''
+
     
 
 class User(Model):
 
+    __slots__ = ('id', 'username', 'password_hash')
+    columns = {'id': 'id', 'username': 'username', 'password': 'password_hash'}
+    insert_columns = ('username', 'password')
+
     @overload
     def __init__(self, username: str, password: str) -> None: ...
     @overload
@@ -122,7 +528,7 @@ class User(Model):
         if len(args) == 2:
             self.id = None
             self.username = args[0]
-            self.password_hash = generate_password_hash(args[1])
+            self.password_hash = hash_password(args[1])
 
         elif len(args) == 3:
             self.id = args[0]
@@ -141,37 +547,64 @@ class User(Model):
 
         else:
             raise ValueError(f'init de User espera dois ou três argumentos, mas recebeu {len(args)}\nargs')
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> Self:
+        user = cls.__new__(cls)
+        user.id, user.username, user.password_hash = row
+        return user
         
     def save(self) -> None:
         
         db = get_db()
-        db.execute(
-            'INSERT INTO user (username, password) VALUES (?,?)',
-            (self.username, self.password_hash)
-        )
-        db.commit()
         self.id = db.execute(
-            'SELECT MAX(id) FROM user'
+            'INSERT INTO user (username, password) VALUES (?,?) RETURNING id',
+            (self.username, self.password_hash)
         ).fetchone()[0]
+        commit()
+        self._identify()
 
     @classmethod
     def create_and_save(cls, username: str, password: str) -> Self:
         return cls._create_and_save(
             username = username,
-            password = generate_password_hash(password)
+            password = hash_password(password)
         )
 
+    def _insert_values(self) -> tuple[Any, ...]:
+        return self.username, self.password_hash
+
     def __repr__(self) -> str:
         return f'User(username={self.username})'
 
 
 class Post(Model):
 
+    __slots__ = ('id', '_user', 'title', 'body', 'like_count', 'created', '_replies', '_liked')
+    columns = {
+        'id': 'id', 'user_id': '_user', 'title': 'title', 'body': 'body',
+        'like_count': 'like_count', 'created': 'created',
+    }
+    insert_columns = ('user_id', 'title', 'body')
+
+    relations = {
+        'user': ('User', '_user', None),
+        'replies': ('Reply', '_replies', 'post_id'),
+    }
+
+    @overload
+    def __init__(
+        self,
+        title: str,
+        body: str,
+    ) -> None: ...
+
     @overload
     def __init__(
         self,
         title: str,
         body: str,
+        user: User | int,
     ) -> None: ...
 
     @overload
@@ -187,7 +620,21 @@ class Post(Model):
 
     def __init__(self, *args, **kwargs) -> None:
         
-        if len(args) == 2:
+        if len(args) == 3:
+            self._user = args[2]
+            self.title = args[0]
+            self.body = args[1]
+            self.like_count = None
+            self.created = None
+
+        elif len(kwargs) == 3:
+            self._user = kwargs['user']
+            self.title = kwargs['title']
+            self.body = kwargs['body']
+            self.like_count = None
+            self.created = None
+
+        elif len(args) == 2:
             if g.user is None:
                 raise ValueError('Usuário não logado.')
             self._user = g.user
@@ -222,8 +669,24 @@ class Post(Model):
             self.created = kwargs['created']
 
         else:
-            raise ValueError(f'Esperava 2 ou 5 argumentos, recebeu {len(args)}\n{args}')
+            raise ValueError(f'Esperava 2, 3 ou 6 argumentos, recebeu {len(args)}\n{args}')
+
+        self._replies = None
+        self._liked = None
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> Self:
+        post = cls.__new__(cls)
+        post.id, post._user, post.title, post.body, post.like_count, post.created = row
+        post._replies = None
+        post._liked = None
+        return post
+
 
+    @property
+    def user_id(self) -> int:
+        """Retorna o id do autor sem consultar o banco de dados."""
+        return _id_of(self._user)
 
     @property
     def user(self) -> User:
@@ -241,23 +704,67 @@ class Post(Model):
     @property
     def replies(self) -> list["Reply"]:
 
-        db = get_db()
-        data = db.execute(
-            'SELECT * FROM reply WHERE post_id = ?',
-            (self.id,)
-        ).fetchall()
+        # As respostas podem já ter sido carregadas por 'prefetch' ou por um acesso anterior
+        if getattr(self, '_replies', None) is None:
+            db = get_db()
+            rows = db.execute(
+                'SELECT * FROM reply WHERE post_id = ? ORDER BY id',
+                (self.id,)
+            ).fetchall()
+            self._replies = [Reply.from_row(row)._identify() for row in rows]
 
-        replies = [Reply(**data_reply) for data_reply in data]
-        return replies
+        return self._replies
     
+    def liked_by(self, user: User | None) -> bool:
+        """Retorna True se 'user' curtiu o post, usando o estado carregado por 'prefetch' quando disponível."""
+
+        if user is None:
+            return False
+
+        liked = getattr(self, '_liked', None)
+        if liked is not None and liked[0] == user.id:
+            return liked[1]
+
+        like = Like.get(post_id = self.id, user_id = user.id)
+        self._liked = (user.id, like is not None)
+        return self._liked[1]
+    
+    @classmethod
+    def prefetch(cls, objs: list[Self], *relations: str, liked_by: User | None = None) -> list[Self]:
+        """
+        Igual a 'Model.prefetch'. Se 'liked_by' for fornecido, também carrega,
+        em uma única consulta, quais dos posts foram curtidos por esse usuário.
+
+        ```
+        posts = Post.prefetch(posts, 'user', 'replies__user', liked_by = g.user)
+        ```
+        """
+
+        super().prefetch(objs, *relations)
+        if liked_by is None:
+            return objs
+
+        liked = set()
+        db = get_db()
+        for chunk in _chunks([post.id for post in objs]):
+            rows = db.execute(
+                f'SELECT post_id FROM like WHERE user_id = ? AND post_id IN ({", ".join("?" for _ in chunk)})',
+                (liked_by.id, *chunk)
+            ).fetchall()
+            liked.update(row['post_id'] for row in rows)
+
+        for post in objs:
+            post._liked = (liked_by.id, post.id in liked)
+        return objs
+
     def add_reply(self, body: str) -> "Reply":
         """
         Adiciona um Reply ao banco de dados. O usuário autor do reply será o usuário logado.
         """
         
         return Reply.create_and_save(
-            post_id = self.id,
-            user_id = g.user.id,
+            post = self,
+            user = g.user,
             body = body
         )
 
@@ -278,22 +785,56 @@ class Post(Model):
         if check_author and post.user.id != g.user.id:
             abort(403, FORBIDDEN)
         return post
-        
+
+    @classmethod
+    def get_page(
+        cls,
+        size: int,
+        before: tuple[str, int] | None = None,
+        after: tuple[str, int] | None = None
+    ) -> tuple[list[Self], bool, bool]:
+        """
+        Retorna uma página do feed, do post mais recente para o mais antigo,
+        usando paginação por cursor em (created, id).
+
+        :param size: Quantidade máxima de posts na página
+        :param before: Chave (created, id) do último post da página anterior; retorna os posts mais antigos que ela
+        :param after: Chave (created, id) do primeiro post da página seguinte; retorna os posts mais novos que ela
+        :return: Os posts, se existem posts mais novos e se existem posts mais antigos que os da página
+        """
+
+        # Busca um post a mais para saber se há outra página na mesma direção
+        if after is not None:
+            posts = cls.get_ordered(('created', 'id'), limit = size + 1, after = after)
+            has_newer = len(posts) > size
+            return posts[:size][::-1], has_newer, True
+
+        posts = cls.get_ordered(('-created', '-id'), limit = size + 1, after = before)
+        has_older = len(posts) > size
+        return posts[:size], before is not None, has_older
     
     def save(self) -> None:
 
         db = get_db()
-        db.execute(
-            'INSERT INTO post (user_id, title, body) VALUES (?,?,?)',
-            (self.user.id, self.title, self.body)
-        )
-        db.commit()
         post = db.execute(
-            'SELECT MAX(id) FROM post'
+            'INSERT INTO post (user_id, title, body) VALUES (?,?,?) RETURNING id, like_count, created',
+            (self.user_id, self.title, self.body)
         ).fetchone()
-        self.id = post[0]
-        self.like_count = 0
-        self.created = post[-1]
+        commit()
+        self.id = post['id']
+        self.like_count = post['like_count']
+        self.created = post['created']
+        self._identify()
+
+    def _insert_values(self) -> tuple[Any, ...]:
+        return self.user_id, self.title, self.body
+
+    @classmethod
+    def bulk_create(cls, objs: Sequence[Self], batch_size: int = 1000) -> list[int]:
+        ids = super().bulk_create(objs, batch_size)
+        for post in objs:
+            post.like_count = 0
+        return ids
 
     def __repr__(self) -> str:
         return f'Post(title = {self.title[:10]}, body={self.body[:10]}, user={self.user.username})'
@@ -301,6 +842,15 @@ class Post(Model):
 
 class Like(Model):
 
+    __slots__ = ('id', '_post', '_user', 'created')
+    columns = {'id': 'id', 'post_id': '_post', 'user_id': '_user', 'created': 'created'}
+    insert_columns = ('post_id', 'user_id')
+
+    relations = {
+        'post': ('Post', '_post', None),
+        'user': ('User', '_user', None),
+    }
+
     @overload
     def __init__(
         self,
@@ -342,6 +892,11 @@ class Like(Model):
         else:
             raise ValueError(f'Esperava 5 ou 3 argumentos *args ou **kwargs')
 
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> Self:
+        like = cls.__new__(cls)
+        like.id, like._post, like._user, like.created = row
+        return like
 
     @property
     def post(self) -> Post:
@@ -358,16 +913,46 @@ class Like(Model):
     def save(self) -> None:
 
         db = get_db()
-        db.execute(
-            'INSERT INTO like (post_id, user_id) VALUES (?,?)',
-            (self.post.id, self.user.id)
-        )
-        db.commit()
         like = db.execute(
-            'SELECT MAX(id) FROM like'
+            'INSERT INTO like (post_id, user_id) VALUES (?,?) RETURNING id, created',
+            (_id_of(self._post), _id_of(self._user))
         ).fetchone()
-        self.id = like[0]
+        commit()
+        self.id = like['id']
         self.created = like['created']
+        self._identify()
+
+    def _insert_values(self) -> tuple[Any, ...]:
+        return _id_of(self._post), _id_of(self._user)
+
+    @classmethod
+    def _after_bulk_create(cls, objs: Sequence[Self]) -> None:
+
+        counts: dict[int, int] = {}
+        for like in objs:
+            post_id = _id_of(like._post)
+            counts[post_id] = counts.get(post_id, 0) + 1
+
+        get_db().executemany(
+            'UPDATE post SET like_count = like_count + ? WHERE id = ?',
+            [(count, post_id) for post_id, count in counts.items()]
+        )
+        for post_id in counts:
+            Post.forget(post_id)
+
+    @classmethod
+    def _before_bulk_delete(cls, ids: Sequence[int], placeholders: str) -> None:
+
+        rows = get_db().execute(
+            f'SELECT post_id, COUNT(*) FROM like WHERE id IN ({placeholders}) GROUP BY post_id',
+            ids
+        ).fetchall()
+        get_db().executemany(
+            'UPDATE post SET like_count = like_count - ? WHERE id = ?',
+            [(count, post_id) for post_id, count in rows]
+        )
+        for post_id, _ in rows:
+            Post.forget(post_id)
 
     def __repr__(self) -> str:
         return f'Like(post={self.post}, user={self.user})'
@@ -375,6 +960,15 @@ class Like(Model):
 
 class Reply(Model):
 
+    __slots__ = ('id', '_post', '_user', 'body', 'created')
+    columns = {'id': 'id', 'post_id': '_post', 'user_id': '_user', 'body': 'body', 'created': 'created'}
+    insert_columns = ('post_id', 'user_id', 'body')
+
+    relations = {
+        'post': ('Post', '_post', None),
+        'user': ('User', '_user', None),
+    }
+
     @overload
     def __init__(
         self,
@@ -421,6 +1015,12 @@ class Reply(Model):
 
         else:
             raise ValueError(f'Esperava 5 ou 3 argumentos *args ou **kwargs')
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> Self:
+        reply = cls.__new__(cls)
+        reply.id, reply._post, reply._user, reply.body, reply.created = row
+        return reply
         
     @property
     def post(self) -> Post:
@@ -438,16 +1038,26 @@ class Reply(Model):
     def save(self) -> None:
 
         db = get_db()
-        db.execute(
-            'INSERT INTO reply (post_id, user_id, body) values (?,?,?)',
-            (self.post.id, self.user.id, self.body)
-        )
-        db.commit()
         reply = db.execute(
-            'SELECT MAX(id) FROM reply'
+            'INSERT INTO reply (post_id, user_id, body) VALUES (?,?,?) RETURNING id, created',
+            (_id_of(self._post), _id_of(self._user), self.body)
         ).fetchone()
-        self.id = reply[0]
-        self.created = reply[-1]
+        commit()
+        self.id = reply['id']
+        self.created = reply['created']
+        self._identify()
+        # As respostas já carregadas do post não incluem esta
+        Post.forget(_id_of(self._post))
+        if isinstance(self._post, Post):
+            self._post._replies = None
+
+    def _insert_values(self) -> tuple[Any, ...]:
+        return _id_of(self._post), _id_of(self._user), self.body
+
+    @classmethod
+    def _after_bulk_create(cls, objs: Sequence[Self]) -> None:
+        for post_id in {_id_of(reply._post) for reply in objs}:
+            Post.forget(post_id)
 
     def __repr__(self) -> str:
         return f'Reply(post={self.post}, user={self.user}, body={self.body})'
@@ -0,0 +1,174 @@
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import random
+import time
+import click
+from flask import current_app, g, request, Flask
+from flask.cli import AppGroup
+
+from .messages import NO_PROFILES
+
+
+def should_profile() -> bool:
+    '''
+    Decide se a requisição atual será medida: sempre, com PROFILER_ENABLED; quando o cabeçalho
+    'X-Profile-Token' corresponde a PROFILER_TOKEN; ou por sorteio, com a taxa PROFILER_SAMPLE_RATE.
+    '''
+
+    config = current_app.config
+    if config['PROFILER_ENABLED']:
+        return True
+
+    token = config['PROFILER_TOKEN']
+    header = request.headers.get('X-Profile-Token')
+    if token and header and hmac.compare_digest(header.encode(), token.encode()):
+        return True
+
+    rate = config['PROFILER_SAMPLE_RATE']
+    return rate > 0 and random.random() < rate
+
+
+def start_profile() -> None:
+
+    if should_profile():
+        g.profile = cProfile.Profile()
+        g.profile_start = time.perf_counter()
+        g.profile.enable()
+
+
+def stop_profile(e = None) -> None:
+
+    profile: cProfile.Profile | None = g.pop('profile', None)
+    if profile is None:
+        return
+    profile.disable()
+    elapsed = time.perf_counter() - g.pop('profile_start')
+
+    config = current_app.config
+    dump(
+        profile,
+        config['PROFILER_DIR'],
+        f'{request.method}-{request.endpoint or "404"}',
+        elapsed,
+        config['PROFILER_TOP'],
+        config['PROFILER_MAX_FILES']
+    )
+
+
+def dump(profile: cProfile.Profile, directory: str, name: str, elapsed: float, top: int, max_files: int) -> str:
+    '''
+    Grava o perfil em '<directory>/<horário>-<nome>-<duração>ms.prof', junto com um resumo em texto
+    das 'top' funções com maior tempo acumulado, e apaga os perfis mais antigos além de 'max_files'.
+    '''
+
+    os.makedirs(directory, exist_ok = True)
+    stamp = time.strftime('%Y%m%d-%H%M%S') + f'{time.time() % 1:.6f}'[1:]
+    base = os.path.join(directory, f'{stamp}-{name}-{elapsed * 1000:.0f}ms')
+
+    profile.dump_stats(base + '.prof')
+    with open(base + '.txt', 'w', encoding = 'utf8') as f:
+        pstats.Stats(profile, stream = f).sort_stats('cumulative').print_stats(top)
+
+    for path in list_profiles(directory)[:-max_files or None]:
+        os.remove(path)
+        if os.path.exists(path[:-5] + '.txt'):
+            os.remove(path[:-5] + '.txt')
+    return base + '.prof'
+
+
+def list_profiles(directory: str) -> list[str]:
+    '''Retorna os arquivos .prof do diretório, do mais antigo para o mais recente.'''
+
+    if not os.path.isdir(directory):
+        return []
+    # O nome começa com o horário, então a ordem alfabética é a cronológica
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory)) if name.endswith('.prof')]
+
+
+def _function_name(func: tuple[str, int, str]) -> str:
+    filename, line, name = func
+    return f'{os.path.basename(filename)}:{line}({name})' if line else name
+
+
+def diff(before: pstats.Stats, after: pstats.Stats, top: int) -> list[tuple[str, float, float]]:
+    '''Retorna as 'top' funções cujo tempo acumulado mais mudou entre os perfis: (função, antes, depois).'''
+
+    functions = set(before.stats) | set(after.stats)
+    rows = [
+        (
+            func,
+            before.stats[func][3] if func in before.stats else 0.0,
+            after.stats[func][3] if func in after.stats else 0.0,
+        )
+        for func in functions
+    ]
+    rows.sort(key = lambda row: abs(row[2] - row[1]), reverse = True)
+    return [(_function_name(func), old, new) for func, old, new in rows[:top]]
+
+
+profiles_cli = AppGroup('profiles', help = 'Lista, agrega e compara os perfis gravados pelo profiler.')
+
+
+def _profiles(pattern: str | None) -> list[str]:
+
+    paths = list_profiles(current_app.config['PROFILER_DIR'])
+    if pattern:
+        paths = [path for path in paths if pattern in os.path.basename(path)]
+    if not paths:
+        raise click.ClickException(NO_PROFILES)
+    return paths
+
+
+@profiles_cli.command('list')
+@click.argument('pattern', required = False)
+def list_command(pattern: str | None):
+    '''Lista os perfis gravados, filtrando pelo trecho do nome PATTERN (ex.: "blog.index").'''
+
+    for path in _profiles(pattern):
+        click.echo(os.path.basename(path))
+
+
+@profiles_cli.command('aggregate')
+@click.argument('pattern', required = False)
+@click.option('--top', default = 30, show_default = True, help = 'Quantidade de funções exibidas.')
+@click.option('--sort', default = 'cumulative', show_default = True, help = 'Ordenação do pstats.')
+def aggregate_command(pattern: str | None, top: int, sort: str):
+    '''Soma os perfis que contêm PATTERN no nome e exibe as funções mais custosas.'''
+
+    paths = _profiles(pattern)
+    stream = io.StringIO()
+    stats = pstats.Stats(*paths, stream = stream)
+    stats.sort_stats(sort).print_stats(top)
+    click.echo(f'{len(paths)} perfis')
+    click.echo(stream.getvalue())
+
+
+@profiles_cli.command('diff')
+@click.argument('before')
+@click.argument('after')
+@click.option('--top', default = 20, show_default = True, help = 'Quantidade de funções exibidas.')
+def diff_command(before: str, after: str, top: int):
+    '''
+    Compara o tempo acumulado por função entre dois grupos de perfis.
+    BEFORE e AFTER são arquivos .prof ou trechos do nome, como no comando 'list'.
+    '''
+
+    def load(value: str) -> pstats.Stats:
+        paths = [value] if os.path.isfile(value) else _profiles(value)
+        return pstats.Stats(*paths, stream = io.StringIO())
+
+    for name, old, new in diff(load(before), load(after), top):
+        click.echo(f'{new - old:+10.4f}s  {old:10.4f}s -> {new:10.4f}s  {name}')
+
+
+def init_app(app: Flask) -> None:
+
+    config = app.config
+    if config['PROFILER_ENABLED'] or config['PROFILER_TOKEN'] or config['PROFILER_SAMPLE_RATE'] > 0:
+        # Registrado antes dos outros hooks, para que o perfil cubra a requisição inteira
+        app.before_request(start_profile)
+        app.teardown_request(stop_profile)
+    app.cli.add_command(profiles_cli)
@@ -0,0 +1,159 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, request, session, Flask
+from werkzeug.exceptions import TooManyRequests
+
+from .db import ThreadLocalConnection
+from .messages import RATE_LIMITED
+
+
+def _take(tokens: float, updated: float, capacity: int, rate: float, now: float) -> tuple[float, float]:
+    '''
+    Reabastece o balde pelo tempo decorrido e tenta consumir uma ficha.
+
+    :return: As fichas restantes e os segundos até a próxima ficha (0 se a requisição foi aceita)
+    '''
+
+    tokens = min(capacity, tokens + (now - updated) * rate)
+    if tokens >= 1:
+        return tokens - 1, 0
+    return tokens, (1 - tokens) / rate
+
+
+class MemoryStore:
+    '''Baldes em memória, válidos apenas para o processo atual. Acima de 'max_size' chaves, descarta as menos usadas.'''
+
+    def __init__(self, max_size: int = 10000) -> None:
+        self.max_size = max_size
+        # chave -> (fichas, horário da última atualização)
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, capacity: int, rate: float, now: float) -> float:
+        '''Consome uma ficha do balde 'key' e retorna os segundos de espera, ou 0 se a requisição foi aceita.'''
+
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens, retry_after = _take(tokens, updated, capacity, rate, now)
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_size:
+                self._buckets.popitem(last = False)
+        return retry_after
+
+
+class SQLiteStore:
+    '''
+    Baldes compartilhados entre processos, guardados em um arquivo SQLite separado do banco de dados do blog.
+    Os baldes cheios há mais de 'max_age' segundos são descartados de tempos em tempos.
+    '''
+
+    def __init__(self, path: str, max_age: float = 3600) -> None:
+        self.path = path
+        self.max_age = max_age
+        self._db = ThreadLocalConnection(path)
+        self._hits = 0
+
+        self._db().execute(
+            'CREATE TABLE IF NOT EXISTS bucket ('
+            '    key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL'
+            ')'
+        )
+
+    def hit(self, key: str, capacity: int, rate: float, now: float) -> float:
+
+        db = self._db()
+        # A leitura e a escrita precisam ser atômicas entre os processos
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            row = db.execute('SELECT tokens, updated FROM bucket WHERE key = ?', (key,)).fetchone()
+            tokens, updated = row if row is not None else (capacity, now)
+            tokens, retry_after = _take(tokens, updated, capacity, rate, now)
+            db.execute(
+                'INSERT OR REPLACE INTO bucket (key, tokens, updated) VALUES (?,?,?)',
+                (key, tokens, now)
+            )
+
+            self._hits += 1
+            if self._hits % 1000 == 0:
+                db.execute('DELETE FROM bucket WHERE updated < ?', (now - self.max_age,))
+            db.execute('COMMIT')
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+        return retry_after
+
+
+class RateLimiter:
+    '''
+    Limita as requisições de cada cliente por endpoint, com um balde de fichas:
+    o balde comporta 'limit' fichas, é reabastecido com 'limit' fichas a cada 'period' segundos
+    e cada requisição consome uma.
+
+    As regras são indexadas pelo endpoint:
+
+    ```
+    {'auth.login': {'limit': 10, 'period': 60, 'key': 'ip', 'methods': ('POST',)}}
+    ```
+
+    'key' pode ser 'ip', 'user' (o id da sessão, ou o IP se não houver login) ou 'user+ip'.
+    Sem 'methods', a regra vale para todos os métodos.
+    '''
+
+    def __init__(self, store: MemoryStore | SQLiteStore, rules: dict[str, dict]) -> None:
+        self.store = store
+        self.rules = rules
+
+    @staticmethod
+    def client_key(kind: str) -> str:
+        '''Identifica o cliente sem consultar o banco de dados, apenas pelo IP e pela sessão.'''
+
+        user_id = session.get('user_id')
+        if kind == 'ip' or user_id is None:
+            return f'ip:{request.remote_addr}'
+        if kind == 'user':
+            return f'user:{user_id}'
+        if kind == 'user+ip':
+            return f'user:{user_id}:{request.remote_addr}'
+        raise ValueError(f'Chave de limite inválida: {kind!r}')
+
+    def check(self) -> None:
+        '''Consome uma ficha da regra do endpoint atual e lança TooManyRequests se o balde estiver vazio.'''
+
+        rule = self.rules.get(request.endpoint)
+        if rule is None:
+            return
+        methods = rule.get('methods')
+        if methods is not None and request.method not in methods:
+            return
+
+        key = f'{request.endpoint}:{self.client_key(rule.get("key", "ip"))}'
+        retry_after = self.store.hit(key, rule['limit'], rule['limit'] / rule['period'], time.time())
+        if retry_after:
+            raise TooManyRequests(RATE_LIMITED, retry_after = math.ceil(retry_after))
+
+
+def get_limiter() -> RateLimiter | None:
+    '''Retorna o limitador do app atual, ou None se ele estiver desativado.'''
+    return current_app.extensions.get('rate_limiter')
+
+
+def init_app(app: Flask) -> None:
+
+    if not app.config['RATELIMIT_ENABLED']:
+        return
+
+    storage = app.config['RATELIMIT_STORAGE']
+    if storage == 'memory':
+        store = MemoryStore(app.config['RATELIMIT_STORE_SIZE'])
+    elif storage == 'sqlite':
+        store = SQLiteStore(app.config['RATELIMIT_PATH'])
+    else:
+        raise ValueError(f'RATELIMIT_STORAGE inválido: {storage!r}')
+
+    limiter = RateLimiter(store, app.config['RATELIMITS'])
+    app.extensions['rate_limiter'] = limiter
+    # Registrado antes dos blueprints, para rodar antes de carregar o usuário ou calcular hashes
+    app.before_request(limiter.check)
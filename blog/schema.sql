@@ -2,6 +2,8 @@ DROP TABLE IF EXISTS user;
 DROP TABLE IF EXISTS post;
 DROP TABLE IF EXISTS like;
 DROP TABLE IF EXISTS reply;
+DROP TABLE IF EXISTS schema_version;
+DROP TABLE IF EXISTS search;
 
 CREATE TABLE user (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -40,3 +42,10 @@ CREATE TABLE reply (
     FOREIGN KEY (user_id) REFERENCES user (id)
 );
 
+-- Versões aplicadas de 'migrations/'. Novas alterações do schema devem ser feitas com migrações,
+-- para que bancos de dados existentes possam recebê-las com 'flask migrate' sem perder dados
+CREATE TABLE schema_version (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,125 @@
+import re
+import click
+from flask import Flask
+from flask.cli import with_appcontext
+from markupsafe import Markup, escape
+
+from .db import get_db, transaction
+from .messages import SEARCH_REBUILT
+
+
+# Marcadores usados por snippet(), trocados por <mark> depois que o texto é escapado
+_START, _END = '\x02', '\x03'
+
+# Peso do título em relação ao corpo no bm25
+TITLE_WEIGHT = 5.0
+
+# Caracteres de controle, que o FTS5 não aceita nem entre aspas (ex.: NUL encerra a string)
+_CONTROL = re.compile(r'[\x00-\x1f\x7f]')
+
+
+def to_match_query(query: str) -> str | None:
+    '''
+    Converte o texto digitado pelo usuário em uma consulta FTS5 que exige todas as palavras.
+    Cada palavra fica entre aspas, para que operadores e caracteres especiais não causem erro de sintaxe,
+    e os caracteres de controle são removidos.
+    '''
+
+    terms = [f'"{term.replace(chr(34), chr(34) * 2)}"' for term in _CONTROL.sub(' ', query).split()]
+    return ' '.join(terms) or None
+
+
+def highlight(snippet: str) -> Markup:
+    '''Escapa o trecho retornado por snippet() e destaca os termos encontrados com <mark>.'''
+    return Markup(
+        str(escape(snippet)).replace(_START, '<mark>').replace(_END, '</mark>')
+    )
+
+
+def search(query: str, limit: int, offset: int = 0) -> tuple[list[dict], bool]:
+    '''
+    Busca 'query' nos títulos e corpos dos posts e nas respostas, ordenando pela relevância (bm25).
+
+    :return: Os resultados da página e se existem mais resultados depois dela
+    '''
+
+    match = to_match_query(query)
+    if match is None:
+        return [], False
+
+    rows = get_db().execute(
+        'SELECT search.rowid % 2 = 1 AS is_reply, post.id AS post_id, post.title, post.created,'
+        '    user.username,'
+        f"    snippet(search, 0, '{_START}', '{_END}', '…', 12) AS title_snippet,"
+        f"    snippet(search, 1, '{_START}', '{_END}', '…', 24) AS body_snippet"
+        ' FROM search'
+        ' JOIN post ON post.id = search.post_id'
+        ' JOIN user ON user.id = post.user_id'
+        ' WHERE search MATCH ?'
+        f' ORDER BY bm25(search, {TITLE_WEIGHT}, 1.0)'
+        ' LIMIT ? OFFSET ?',
+        (match, limit + 1, offset)
+    ).fetchall()
+
+    results = [
+        {
+            'is_reply': bool(row['is_reply']),
+            'post_id': row['post_id'],
+            'title': row['title'],
+            'created': row['created'],
+            'username': row['username'],
+            'title_snippet': highlight(row['title_snippet']),
+            'body_snippet': highlight(row['body_snippet']),
+        }
+        for row in rows[:limit]
+    ]
+    return results, len(rows) > limit
+
+
+def rebuild_index(batch_size: int = 1000) -> int:
+    '''
+    Recria o índice de busca a partir das tabelas post e reply, gravando 'batch_size' linhas por transação
+    para não bloquear as escritas do blog por muito tempo. Retorna a quantidade de linhas indexadas.
+    '''
+
+    db = get_db()
+    with transaction():
+        db.execute('DELETE FROM search')
+
+    total = 0
+    sources = (
+        'SELECT id * 2, title, body, id FROM post WHERE id > ? ORDER BY id LIMIT ?',
+        "SELECT id * 2 + 1, '', body, post_id FROM reply WHERE id > ? ORDER BY id LIMIT ?",
+    )
+    for command in sources:
+        last = 0
+        while True:
+            rows = db.execute(command, (last, batch_size)).fetchall()
+            if not rows:
+                break
+            # REPLACE porque os gatilhos podem ter indexado uma linha criada durante a reconstrução
+            with transaction():
+                db.executemany(
+                    'INSERT OR REPLACE INTO search (rowid, title, body, post_id) VALUES (?,?,?,?)',
+                    [tuple(row) for row in rows]
+                )
+            last = rows[-1][0] // 2
+            total += len(rows)
+
+    with transaction():
+        db.execute("INSERT INTO search (search) VALUES ('optimize')")
+    return total
+
+
+@click.command('rebuild-search')
+@click.option('--batch-size', default = 1000, show_default = True, help = 'Linhas gravadas por transação.')
+@with_appcontext
+def rebuild_search_command(batch_size: int):
+    '''Recria o índice de busca de posts e respostas.'''
+
+    total = rebuild_index(batch_size)
+    click.echo(SEARCH_REBUILT.format(total))
+
+
+def init_app(app: Flask) -> None:
+    app.cli.add_command(rebuild_search_command)
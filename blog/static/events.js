@@ -0,0 +1,44 @@
+// Atualizações ao vivo dos posts, carregado apenas com EVENTS_ENABLED.
+// Usa 'pendingLikes' e 'renderLike' de like.js, que é carregado antes
+
+// Mostra no post um link para recarregar quando chegam respostas novas
+function showNewReplies(article, replies) {
+
+    const current = article.querySelectorAll('.reply').length;
+    if (replies <= current) return;
+
+    let link = article.querySelector('.new-replies');
+    if (link == null) {
+        link = document.createElement('a');
+        link.className = 'new-replies';
+        link.href = `${location.pathname}${location.search}#${article.id}`;
+        link.addEventListener('click', () => location.reload());
+        article.querySelector('.post-footer').appendChild(link);
+    }
+    const count = replies - current;
+    link.innerText = count === 1 ? 'Ver 1 nova resposta' : `Ver ${count} novas respostas`;
+}
+
+// Atualizações ao vivo de likes e respostas dos posts da página
+if (window.EventSource && document.querySelector('article.post')) {
+
+    const events = new EventSource('/events');
+
+    events.addEventListener('posts', (event) => {
+
+        const posts = JSON.parse(event.data);
+        for (const [postId, delta] of Object.entries(posts)) {
+
+            const article = document.getElementById(`post-${postId}`);
+            if (article == null) continue;
+
+            // Um clique ainda não enviado vale mais que o estado do servidor
+            const button = article.querySelector('.like-button');
+            if (delta.likes !== undefined && button && !pendingLikes.has(postId))
+                renderLike(button, button.classList.contains('curtido'), delta.likes);
+
+            if (delta.replies !== undefined)
+                showNewReplies(article, delta.replies);
+        }
+    });
+}
@@ -1,39 +1,89 @@
 // Botões de like dos posts
 const likeButtons = document.querySelectorAll('.like-button');
 
+// Tempo sem cliques antes de enviar os likes ao servidor
+const LIKE_DEBOUNCE = 300;
+
+// post_id -> estado final desejado, ainda não enviado
+const pendingLikes = new Map();
+let likeTimer = null;
+
+function likeButton(postId) {
+    return document.querySelector(`.like-button[data-post-id="${postId}"]`);
+}
+
+// Mostra o estado e a contagem no botão
+function renderLike(button, liked, likeCount) {
+    button.innerText = likeCount + ' Curtir';
+    if (liked)
+        button.classList.add('curtido');
+    else
+        button.classList.remove('curtido');
+}
+
+// Envia em uma única requisição apenas o estado final de cada post clicado
+async function flushLikes() {
+
+    likeTimer = null;
+    if (pendingLikes.size === 0) return;
+
+    const likes = [...pendingLikes].map(([postId, liked]) => ({ post_id: Number(postId), liked }));
+    pendingLikes.clear();
+
+    try {
+        const response = await fetch('/likes', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ likes })
+        });
+
+        if (response.ok) {
+            const data = await response.json();
+            data.likes.forEach(like => {
+                // Um clique feito durante a requisição será enviado no próximo lote
+                const button = likeButton(like.post_id);
+                if (button && !pendingLikes.has(String(like.post_id)))
+                    renderLike(button, like.liked, like.like_count);
+            });
+        }
+
+    } catch (error) {
+        console.error('Erro:', error);
+    }
+}
+
 likeButtons.forEach(button => {
 
-    button.addEventListener('click', async (event) => {
+    button.addEventListener('click', (event) => {
 
         event.preventDefault(); // Evita comportamento padrão, se houver
 
         const postId = button.getAttribute('data-post-id');
         if (postId == null) return;
 
-        // URL para fazer a requisição para dar like
-        const url = `/like/${postId}`;
-
-        try {
-            // Faz a requisição para o servidor usando fetch
-            const response = await fetch(url, { method: 'GET' });
+        // Atualiza o botão na hora e espera os cliques pararem para enviar o estado final
+        const liked = !button.classList.contains('curtido');
+        const likeCount = parseInt(button.innerText) + (liked ? 1 : -1);
+        renderLike(button, liked, likeCount);
+        pendingLikes.set(postId, liked);
 
-            if (response.ok) {
+        clearTimeout(likeTimer);
+        likeTimer = setTimeout(flushLikes, LIKE_DEBOUNCE);
+    });
 
-                // Retorna um json
-                const data = await response.json();
-                button.innerText = data.like_count + ' Curtir';
+});
 
-                // Atualizar o estado do botão
-                if (data.liked)
-                    button.classList.add('curtido');
-                else
-                    button.classList.remove('curtido');
+// Envia os likes pendentes antes de sair da página
+window.addEventListener('pagehide', () => {
 
-            }
+    if (pendingLikes.size === 0) return;
 
-        } catch (error) {
-            console.error('Erro:', error);
-        }
+    const likes = [...pendingLikes].map(([postId, liked]) => ({ post_id: Number(postId), liked }));
+    pendingLikes.clear();
+    fetch('/likes', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ likes }),
+        keepalive: true
     });
-
-});
\ No newline at end of file
+});
@@ -1,3 +1,5 @@
+import re
+import html
 import pytest
 from blog.db import get_db
 from flask import Flask
@@ -202,3 +204,118 @@ def test_reply(app: Flask, client: FlaskClient, auth: AuthActions):
         ).fetchone()
         assert reply['body'] == 'Body teste ...'
 
+
+
+def test_index_pagination(app: Flask, client: FlaskClient):
+    """
+    1. Define o tamanho da página como 4
+    2. Verifica se a primeira página contém apenas o link para posts mais antigos
+    3. Segue o link e verifica se a segunda página contém os 2 posts restantes e o link para posts mais novos
+    4. Segue o link de volta e verifica se a primeira página é a mesma
+    """
+
+    app.config['POSTS_PER_PAGE'] = 4
+
+    first = client.get('/')
+    assert first.data.count(b'class="post"') == 4
+    assert b'class="newer"' not in first.data
+    older = re.search(rb'href="([^"]+)" class="older"', first.data).group(1)
+
+    second = client.get(html.unescape(older.decode()))
+    assert second.data.count(b'class="post"') == 2
+    assert b'class="older"' not in second.data
+    # O post mais antigo do feed é o de id 1
+    assert b'test\nbody' in second.data
+    newer = re.search(rb'href="([^"]+)" class="newer"', second.data).group(1)
+
+    back = client.get(html.unescape(newer.decode()))
+    assert back.data.count(b'class="post"') == 4
+    assert b'class="newer"' not in back.data
+
+
+def test_index_invalid_cursor(client: FlaskClient):
+    assert client.get('/?before=invalido').status_code == 400
+
+
+def test_index_conditional_get(app: Flask, client: FlaskClient, auth: AuthActions):
+    """
+    1. Faz uma requisição para '/' e guarda o ETag
+    2. Verifica se a requisição com 'If-None-Match' retorna 304 sem consultar a tabela post
+    3. Faz login e verifica se o ETag muda para o usuário logado
+    4. Dá like em um post e verifica se o ETag anterior deixa de valer
+    5. Verifica se o ETag também muda com FRAGMENT_CACHE_VERSION e com o manifesto dos arquivos estáticos
+    """
+
+    queries = []
+    @app.before_request
+    def trace():
+        get_db().set_trace_callback(queries.append)
+
+    response = client.get('/')
+    etag = response.headers['ETag']
+    assert 'Last-Modified' in response.headers
+
+    queries.clear()
+    response = client.get('/', headers = {'If-None-Match': etag})
+    assert response.status_code == 304
+    assert not any('FROM post' in query for query in queries)
+
+    auth.login()
+    response = client.get('/', headers = {'If-None-Match': etag})
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert client.get('/', headers = {'If-None-Match': etag}).status_code == 304
+
+    client.post('/like/1')
+    response = client.get('/', headers = {'If-None-Match': etag})
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+
+    # Um deploy com novos templates ou um novo build dos arquivos estáticos também invalida o ETag
+    app.config['FRAGMENT_CACHE_VERSION'] += 1
+    response = client.get('/', headers = {'If-None-Match': etag})
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+
+    app.extensions['asset_manifest'] = {'bundles': {'main': 'dist/main.abc123.css'}, 'files': {}}
+    assert client.get('/', headers = {'If-None-Match': etag}).status_code == 200
+
+
+def test_search(app: Flask, client: FlaskClient, auth: AuthActions):
+    """
+    1. Busca um termo que aparece apenas em uma resposta
+    2. Verifica se o termo é destacado e se o link leva ao post no feed
+    3. Edita um post e verifica se o índice foi atualizado pelos gatilhos
+    4. Verifica se caracteres especiais, de controle e HTML no termo não causam erro
+    """
+
+    response = client.get('/search?q=responde')
+    assert response.status_code == 200
+    assert response.data.count(b'<mark>responde</mark>') == 2
+
+    auth.login()
+    client.post('/update/1', data = {'title': 'palavra única', 'body': 'texto'})
+    response = client.get('/search?q=unica')
+    assert '<mark>única</mark>'.encode() in response.data
+    assert b'#post-1' in response.data
+    assert b'palavra' not in client.get('/search?q=test').data
+
+    response = client.get('/search?q="<script>" AND (')
+    assert response.status_code == 200
+    assert b'<script>' not in response.data
+
+    assert client.get('/search?q=%00').status_code == 200
+    assert client.get('/search?q=respon%00de%01').status_code == 200
+
+
+def test_rebuild_search_command(app: Flask, runner):
+
+    with app.app_context():
+        get_db().execute('DELETE FROM search')
+        get_db().commit()
+
+    result = runner.invoke(args = ['rebuild-search', '--batch-size', '2'])
+    assert '8 linhas' in result.output
+
+    with app.app_context():
+        assert get_db().execute("SELECT COUNT(*) FROM search WHERE search MATCH 'responde'").fetchone()[0] == 2
@@ -0,0 +1,152 @@
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient
+from conftest import AuthActions
+from blog.db import get_db
+from blog import likes
+from blog.likes import LikeBuffer, set_likes
+from blog.models import Post
+
+
+@pytest.fixture
+def buffer(app: Flask):
+    """Ativa o modo write-behind com um intervalo longo, para que os likes só sejam gravados pelo teste."""
+
+    buffer = LikeBuffer(app, interval = 60_000, max_events = 1000)
+    app.extensions['like_buffer'] = buffer
+    yield buffer
+    buffer.close()
+
+
+def like_state(app: Flask, post_id: int) -> tuple[int, int]:
+    with app.app_context():
+        db = get_db()
+        return (
+            db.execute('SELECT like_count FROM post WHERE id = ?', (post_id,)).fetchone()[0],
+            db.execute('SELECT COUNT(*) FROM like WHERE post_id = ?', (post_id,)).fetchone()[0]
+        )
+
+
+def test_write_behind(app: Flask, client: FlaskClient, auth: AuthActions, buffer: LikeBuffer):
+    """
+    1. Dá like, tira o like e dá like de novo
+    2. Verifica se o banco de dados ainda não foi alterado, mas as respostas e o feed já mostram o like
+    3. Grava os likes e verifica se o banco de dados recebeu apenas o estado final
+    """
+
+    auth.login()
+    assert client.post('/like/1').json == {'liked': True, 'like_count': 1}
+    assert client.post('/like/1').json == {'liked': False, 'like_count': 0}
+    assert client.post('/like/1').json == {'liked': True, 'like_count': 1}
+
+    assert like_state(app, 1) == (0, 0)
+    response = client.get('/')
+    assert b'curtido' in response.data
+    assert b'1 Curtir' in response.data
+
+    buffer.flush()
+    assert like_state(app, 1) == (1, 1)
+    assert b'1 Curtir' in client.get('/').data
+
+    assert client.post('/like/1').json == {'liked': False, 'like_count': 0}
+    buffer.close()
+    assert like_state(app, 1) == (0, 0)
+
+
+def test_write_behind_existing_like(app: Flask, buffer: LikeBuffer):
+    """Verifica se a contagem continua consistente quando o like já foi gravado por outro processo."""
+
+    with app.test_request_context():
+        buffer.toggle(2, 1)
+        db = get_db()
+        db.execute('INSERT INTO like (post_id, user_id) VALUES (2, 1)')
+        db.execute('UPDATE post SET like_count = 1 WHERE id = 2')
+        db.commit()
+
+    buffer.flush()
+    assert like_state(app, 2) == (1, 1)
+
+
+def test_write_behind_read_during_flush(app: Flask, buffer: LikeBuffer, monkeypatch: pytest.MonkeyPatch):
+    """Verifica se uma leitura feita depois do commit, enquanto a gravação invalida o cache, não conta o like duas vezes."""
+
+    with app.app_context():
+        buffer.toggle(1, 1, True)
+
+    counts = []
+
+    def bump_feed():
+        # Chamado pela gravação, depois do commit
+        post = buffer.merge([Post.get(check_author = False, id = 1)])[0]
+        counts.append(post.like_count)
+        counts.append(buffer.toggle(1, 1, True)[1])
+
+    monkeypatch.setattr(likes, 'bump_feed', bump_feed)
+    buffer.flush()
+    assert counts == [1, 1]
+    assert like_state(app, 1) == (1, 1)
+
+
+def test_like_toggle(app: Flask, client: FlaskClient, auth: AuthActions):
+    """
+    1. Verifica se o like só aceita POST e se inverte o estado a cada requisição
+    2. Verifica se o estado enviado é aplicado sem inverter
+    3. Verifica se cada like custa no máximo três comandos na transação
+    """
+
+    auth.login()
+    assert client.get('/like/1').status_code == 405
+    assert client.post('/like/1').json == {'liked': True, 'like_count': 1}
+    assert client.post('/like/1', json = {'liked': True}).json == {'liked': True, 'like_count': 1}
+    assert client.post('/like/1').json == {'liked': False, 'like_count': 0}
+    assert client.post('/like/1', json = {'liked': False}).json == {'liked': False, 'like_count': 0}
+    assert like_state(app, 1) == (0, 0)
+    assert client.post('/like/99').status_code == 404
+
+    with app.app_context():
+        queries = []
+        get_db().set_trace_callback(queries.append)
+        set_likes(1, {2: None})
+        get_db().set_trace_callback(None)
+    statements = [query for query in queries if query.startswith(('DELETE', 'INSERT', 'UPDATE', 'SELECT'))]
+    assert len(statements) == 3
+    assert like_state(app, 2) == (1, 1)
+
+
+def test_like_batch(app: Flask, client: FlaskClient, auth: AuthActions):
+    """
+    1. Envia vários estados, incluindo um post repetido e um que não existe
+    2. Verifica se vale o último estado de cada post e se o post inexistente é ignorado
+    3. Verifica se uma lista inválida é recusada
+    """
+
+    auth.login()
+    response = client.post('/likes', json = {'likes': [
+        {'post_id': 1, 'liked': True},
+        {'post_id': 2, 'liked': True},
+        {'post_id': 2, 'liked': False},
+        {'post_id': 99, 'liked': True},
+    ]})
+    assert response.json == {'likes': [
+        {'post_id': 1, 'liked': True, 'like_count': 1},
+        {'post_id': 2, 'liked': False, 'like_count': 0},
+    ]}
+    assert like_state(app, 1) == (1, 1)
+    assert like_state(app, 2) == (0, 0)
+    with app.app_context():
+        assert get_db().execute('SELECT COUNT(*) FROM like WHERE post_id = 99').fetchone()[0] == 0
+
+    assert client.post('/likes', json = {'likes': [{'post_id': '1'}]}).status_code == 400
+    assert client.post('/likes', json = {'likes': [{'post_id': True, 'liked': True}]}).status_code == 400
+    assert like_state(app, 1) == (1, 1)
+    assert client.post('/likes', json = {'likes': [{'post_id': 1, 'liked': 'sim'}]}).status_code == 400
+    assert client.post('/likes', data = 'x').status_code == 400
+
+
+@pytest.mark.parametrize('body', ([1], 'x', 3, None))
+def test_like_body_not_object(client: FlaskClient, auth: AuthActions, body):
+    """Verifica se um corpo JSON válido que não é um objeto é recusado com 400."""
+
+    auth.login()
+    assert client.post('/like/1', json = body).status_code == (200 if body is None else 400)
+    assert client.post('/likes', json = body).status_code == 400
@@ -1,8 +1,9 @@
 import pytest
-from flask import Flask
+from flask import Flask, g
 
 from blog.db import get_db
-from blog.models import User, Post, ModelType
+from blog.models import User, Post, Like, Reply, ModelType
+from datetime import datetime
 from werkzeug.security import check_password_hash
 from typing import Any
 
@@ -101,3 +102,207 @@ def test_user_save(app: Flask):
         user.save()
         assert user.id is not None
 
+
+
+def test_get_ordered(app: Flask):
+
+    with app.app_context():
+
+        posts = Post.get_ordered(('-created', '-id'), limit = 3)
+        assert [post.id for post in posts] == [6, 5, 4]
+
+        last = posts[-1]
+        older = Post.get_ordered(('-created', '-id'), after = (str(last.created), last.id))
+        assert [post.id for post in older] == [3, 2, 1]
+
+        assert [post.id for post in Post.get_ordered(('id',), limit = 2, title = 'test')] == [5, 6]
+
+        with pytest.raises(ValueError):
+            Post.get_ordered(('-created', 'id'), after = (str(last.created), last.id))
+
+
+def test_prefetch(app: Flask):
+
+    with app.app_context():
+
+        posts = Post.get_ordered(('id',))
+        user = User.get(id = 2)
+        db = get_db()
+        db.execute('INSERT INTO like (post_id, user_id) VALUES (2, 2)')
+
+        queries = []
+        db.set_trace_callback(queries.append)
+        Post.prefetch(posts, 'user', 'replies__user', liked_by = user)
+        # No máximo uma consulta por relação, independente da quantidade de posts.
+        # Os autores das respostas já foram carregados na primeira relação, então não há consulta para eles
+        assert len(queries) == 3
+
+        queries.clear()
+        assert [post.user.username for post in posts] == ['a'] * 6
+        assert [reply.user.username for reply in posts[0].replies] == ['b']
+        assert posts[1].replies[0].body == 'a responde b'
+        assert posts[2].replies == []
+        assert [post.liked_by(user) for post in posts[:3]] == [False, True, False]
+        assert queries == []
+        db.set_trace_callback(None)
+
+
+def test_save_returning(app: Flask):
+    """
+    1. Salva uma resposta e um like e verifica se os ids e as datas vêm do próprio INSERT
+    2. Verifica se o id não é confundido com o de outra linha inserida depois
+    """
+
+    with app.app_context():
+
+        reply = Reply(1, 1, 'resposta')
+        reply.save()
+        get_db().execute("INSERT INTO reply (post_id, user_id, body) VALUES (2, 2, 'outra')")
+        assert reply.id == 3
+        assert isinstance(reply.created, datetime)
+
+        like = Like(2, 3)
+        like.save()
+        row = get_db().execute('SELECT * FROM like WHERE id = ?', (like.id,)).fetchone()
+        assert (row['post_id'], row['user_id'], row['created']) == (2, 3, like.created)
+
+
+def test_identity_map(app: Flask):
+    """
+    1. Verifica se buscar o mesmo id duas vezes retorna o mesmo objeto, sem uma nova consulta
+    2. Verifica se as relações usam os objetos já carregados
+    3. Verifica se 'forget' e o fim do contexto descartam o mapa
+    """
+
+    with app.app_context():
+
+        user = User.get(id = 1)
+        queries = []
+        get_db().set_trace_callback(queries.append)
+        assert User.get(id = 1) is user
+        post = Post.get(check_author = False, id = 2)
+        assert post.user is user
+        assert post.replies[0].user is user
+        assert Post.get(check_author = False, id = 2) is post
+        assert len(queries) == 2
+
+        Post.forget(2)
+        assert Post.get(check_author = False, id = 2) is not post
+        get_db().set_trace_callback(None)
+
+    with app.app_context():
+        assert User.get(id = 1) is not user
+
+
+@pytest.mark.parametrize('model_type', (User, Post, Like, Reply))
+def test_from_row(app: Flask, model_type: ModelType):
+    """Verifica se 'from_row' carrega todas as colunas e se os objetos não têm __dict__."""
+
+    with app.app_context():
+        if model_type is Like:
+            get_db().execute('INSERT INTO like (post_id, user_id) VALUES (1, 1)')
+        row = get_db().execute(f'SELECT * FROM {model_type.table} LIMIT 1').fetchone()
+        obj = model_type.from_row(row)
+
+        assert obj.id == row['id']
+        assert not hasattr(obj, '__dict__')
+        if model_type is Post:
+            assert (obj.user_id, obj.title, obj.created) == (row['user_id'], row['title'], row['created'])
+
+
+def test_query(app: Flask):
+    """
+    1. Verifica se a consulta só é executada quando os objetos são pedidos
+    2. Verifica filtro por objeto, ordenação, limite e deslocamento
+    3. Verifica 'count' e 'exists' sem carregar os objetos
+    4. Verifica se 'only' carrega apenas as colunas pedidas
+    """
+
+    with app.app_context():
+
+        queries = []
+        get_db().set_trace_callback(queries.append)
+
+        user = User.get(id = 1)
+        query = Post.query.filter(user = user).order_by('-id')
+        assert len(queries) == 1
+
+        assert [post.id for post in query.limit(2)] == [6, 5]
+        assert [post.id for post in query.limit(2).offset(3)] == [3, 2]
+        assert query.filter(title = 'test').count() == 2
+        assert query.limit(2).offset(5).count() == 1
+        assert query.filter(title = 'nada').exists() is False
+        assert Post.query.filter(user_id = 2).first() is None
+        assert any('COUNT(*)' in query for query in queries)
+
+        post = Post.query.order_by('id').only('id', 'title').first()
+        assert (post.id, post.title) == (1, 'test title')
+        with pytest.raises(AttributeError):
+            post.body
+
+        with pytest.raises(ValueError):
+            Post.query.filter(**{'id = 1 OR 1': 1})
+        get_db().set_trace_callback(None)
+
+
+def test_query_iterator(app: Flask):
+    """Verifica se 'iterator' lê o cursor em partes e retorna todos os objetos."""
+
+    with app.app_context():
+
+        db = get_db()
+        db.executemany(
+            'INSERT INTO post (title, body, user_id) VALUES (?, ?, 1)',
+            [(f'post {i}', 'body') for i in range(100)]
+        )
+
+        iterator = Post.query.order_by('id').iterator(chunk_size = 7)
+        first = next(iterator)
+        assert first.id == 1
+        assert sum(1 for _ in iterator) == 105
+
+
+def test_bulk_create(app: Flask):
+    """
+    1. Insere posts em vários lotes e verifica se os ids retornados correspondem às linhas inseridas
+    2. Verifica se os likes em lote atualizam like_count e se 'bulk_delete' desfaz a contagem
+    3. Verifica se um erro desfaz todos os lotes
+    """
+
+    with app.app_context():
+
+        db = get_db()
+        posts = [Post(f'post {i}', 'body', 2) for i in range(250)]
+        ids = Post.bulk_create(posts, batch_size = 100)
+        assert ids == list(range(7, 257))
+        assert [post.id for post in posts] == ids
+        row = db.execute('SELECT title, user_id FROM post WHERE id = ?', (ids[-1],)).fetchone()
+        assert (row['title'], row['user_id']) == ('post 249', 2)
+
+        likes = [Like(post_id, user_id) for post_id in (1, 2) for user_id in (1, 2, 3)]
+        like_ids = Like.bulk_create(likes)
+        assert Post.get(check_author = False, id = 1).like_count == 3
+
+        assert Like.bulk_delete(like_ids[:2]) == 2
+        counts = db.execute('SELECT like_count FROM post WHERE id IN (1, 2) ORDER BY id').fetchall()
+        assert [row[0] for row in counts] == [1, 3]
+
+        with pytest.raises(Exception):
+            Reply.bulk_create([Reply(1, 1, 'ok'), Reply(1, 1, None)])
+        assert db.execute('SELECT COUNT(*) FROM reply').fetchone()[0] == 2
+
+
+def test_query_iterator_identity_map(app: Flask):
+    """Verifica se os objetos percorridos por 'iterator' não ficam no mapa de identidade."""
+
+    with app.app_context():
+
+        get_db().executemany(
+            'INSERT INTO post (title, body, user_id) VALUES (?, ?, 1)',
+            [(f'post {i}', 'body') for i in range(100)]
+        )
+
+        before = len(g.setdefault('identity_map', {}))
+        for post in Post.query.iterator(chunk_size = 10):
+            assert len(g.identity_map) == before
+        assert post.id == 106
@@ -2,7 +2,8 @@ import os
 import tempfile
 import pytest
 from blog import create_app
-from blog.db import get_db, init_db
+from blog.db import get_db, get_pool, init_db
+from blog.hashing import get_hasher
 
 from flask import Flask
 from flask.testing import FlaskClient, FlaskCliRunner
@@ -23,7 +24,11 @@ def app() -> Generator[Flask, None, None]:
     
     app = create_app({
         'TESTING': True,
-        'DATABASE': db_path
+        'DATABASE': db_path,
+        # Uma view que repete o mesmo comando muitas vezes (N+1) faz o teste falhar
+        'SQL_INSTRUMENTATION': True,
+        'SQL_NPLUSONE_THRESHOLD': 10,
+        'SQL_NPLUSONE_RAISE': True
     })
 
     with app.app_context():
@@ -32,8 +37,15 @@ def app() -> Generator[Flask, None, None]:
 
     yield app
 
+    with app.app_context():
+        get_pool().close()
+        get_hasher().close()
     os.close(db_fd)
     os.unlink(db_path)
+    # Arquivos criados pelo modo WAL
+    for suffix in ('-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.unlink(db_path + suffix)
 
 @pytest.fixture
 def client(app: Flask) -> FlaskClient:
@@ -0,0 +1,43 @@
+import gzip
+import shutil
+from flask import Flask
+from flask.testing import FlaskClient, FlaskCliRunner
+
+from blog.assets import minify_css
+
+
+def test_minify_css():
+    css = '/* comentário */\na.b:hover ,\nc > d {\n    color: #fff;\n    margin: 0 auto;\n}\n'
+    assert minify_css(css) == 'a.b:hover,c>d{color:#fff;margin:0 auto}'
+
+
+def test_build_assets(app: Flask, client: FlaskClient, runner: FlaskCliRunner, tmp_path):
+    """
+    1. Gera os arquivos em uma cópia de 'static'
+    2. Verifica se as páginas usam um único pacote de CSS e o like.js com hash
+    3. Verifica se o arquivo é servido comprimido e imutável quando o cliente aceita gzip
+    """
+
+    static = tmp_path / 'static'
+    shutil.copytree(app.static_folder, static, ignore = shutil.ignore_patterns('dist'))
+    app.static_folder = str(static)
+
+    result = runner.invoke(args = ['build-assets'])
+    assert 'pacotes de CSS' in result.output
+
+    html = client.get('/').get_data(as_text = True)
+    assert html.count('rel="stylesheet"') == 1
+    assert '/static/dist/index.' in html
+    assert '/static/dist/like.' in html
+
+    href = html.split('/static/dist/index.')[1].split('"')[0]
+    url = f'/static/dist/index.{href}'
+    response = client.get(url, headers = {'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.mimetype == 'text/css'
+    assert 'immutable' in response.headers['Cache-Control']
+    assert b'section.posts{' in gzip.decompress(response.data)
+
+    response = client.get(url)
+    assert 'Content-Encoding' not in response.headers
+    assert b'section.posts{' in response.data
@@ -0,0 +1,36 @@
+import sqlite3
+
+from benchmarks import dataset
+from benchmarks.compare import compare
+from benchmarks.run import percentile
+
+
+def test_dataset(tmp_path):
+    """
+    1. Gera um dataset pequeno duas vezes com a mesma semente e verifica se os dados são iguais
+    2. Verifica as quantidades e se like_count corresponde à tabela like
+    """
+
+    config = dataset.DatasetConfig(users = 5, posts = 50, replies = 20, likes = 100)
+    dumps = []
+    for name in ('a.sqlite', 'b.sqlite'):
+        path = str(tmp_path / name)
+        dataset.generate(path, config)
+        db = sqlite3.connect(path)
+        assert db.execute('SELECT COUNT(*) FROM like').fetchone()[0] == 100
+        assert db.execute('SELECT COUNT(*) FROM reply').fetchone()[0] == 20
+        assert db.execute(
+            'SELECT COUNT(*) FROM post WHERE like_count != (SELECT COUNT(*) FROM like WHERE post_id = post.id)'
+        ).fetchone()[0] == 0
+        dumps.append(db.execute('SELECT post_id, user_id FROM like ORDER BY id').fetchall())
+        db.close()
+    assert dumps[0] == dumps[1]
+
+
+def test_compare():
+
+    assert percentile([1, 2, 3, 4], 50) == 2.5
+    baseline = {'results': {'index': {'p50_ms': 10, 'queries_per_op': 3}, 'like': {'p50_ms': 1, 'queries_per_op': 3}}}
+    current = {'results': {'index': {'p50_ms': 10.5, 'queries_per_op': 3}, 'like': {'p50_ms': 1, 'queries_per_op': 4}}}
+    rows = {row['name']: row['regression'] for row in compare(baseline, current, 0.10)}
+    assert rows == {'index': False, 'like': True}
@@ -0,0 +1,127 @@
+import pytest
+from flask import Flask, g
+from flask.testing import FlaskClient
+from conftest import AuthActions
+from blog.cache import (
+    MemoryBackend, SQLiteBackend, FragmentCache, get_cache, get_user_cache, invalidate_user, fill_slots, slot
+)
+from blog.db import get_db
+
+
+def test_memory_backend_lru():
+    """
+    1. Cria um cache com espaço para 2 fragmentos
+    2. Lê 'a' para que ele seja o mais recente
+    3. Insere 'c' e verifica se 'b', o menos usado, foi descartado
+    """
+
+    backend = MemoryBackend(2)
+    backend.set('a', '1')
+    backend.set('b', '2')
+    backend.get_many(['a'])
+    backend.set('c', '3')
+    assert backend.get_many(['a', 'b', 'c']) == {'a': '1', 'c': '3'}
+
+
+@pytest.mark.parametrize('backend_type', ('memory', 'sqlite'))
+def test_invalidate(tmp_path, backend_type: str):
+    """
+    1. Guarda o fragmento do post 1
+    2. Invalida o post 1
+    3. Verifica se a chave mudou e se o fragmento antigo foi descartado
+    4. Verifica se o fragmento do post 2 continua no cache
+    """
+
+    if backend_type == 'memory':
+        backend = MemoryBackend(10)
+    else:
+        backend = SQLiteBackend(str(tmp_path / 'cache.sqlite'), 10)
+    cache = FragmentCache(backend)
+
+    keys = cache.keys('post', [1, 2])
+    cache.set(keys[1], '<p>1</p>')
+    cache.set(keys[2], '<p>2</p>')
+
+    cache.invalidate('post', 1)
+    new_keys = cache.keys('post', [1, 2])
+    assert new_keys[1] != keys[1]
+    assert new_keys[2] == keys[2]
+    assert cache.get_many([keys[1], new_keys[1], keys[2]]) == {keys[2]: '<p>2</p>'}
+
+
+def test_fill_slots():
+    fragment = f'<a class="{slot("cls")}">{slot("label")}</a>'
+    assert fill_slots(fragment, cls = 'x', label = '<b>') == '<a class="x">&lt;b&gt;</a>'
+
+
+def test_index_uses_cache(app: Flask, client: FlaskClient, auth: AuthActions):
+    """
+    1. Renderiza o feed para guardar os fragmentos
+    2. Altera um post direto no banco de dados e verifica se o feed continua usando o fragmento em cache
+    3. Responde ao post e verifica se apenas o fragmento dele foi renderizado novamente
+    4. Verifica se o botão de editar é preenchido para o autor, mas não é guardado no cache
+    """
+
+    client.get('/')
+    with app.app_context():
+        from blog.db import get_db
+        db = get_db()
+        db.execute("UPDATE post SET title = 'alterado' WHERE id IN (1, 2)")
+        db.commit()
+
+    assert b'alterado' not in client.get('/').data
+
+    auth.login()
+    client.post('/reply/1', data = {'body': 'nova resposta'})
+    response = client.get('/')
+    assert response.data.count(b'alterado') == 1
+    assert b'nova resposta' in response.data
+    assert b'href="/update/1"' in response.data
+
+    with app.app_context():
+        cache = get_cache()
+        key = cache.keys('post', [1])[1]
+        assert b'update' not in cache.get_many([key])[key].encode()
+
+
+def _user_queries(app: Flask, client: FlaskClient) -> int:
+    """Faz uma requisição e retorna quantas consultas leram a tabela user."""
+
+    queries = []
+    with app.app_context():
+        db = get_db()
+        db.set_trace_callback(queries.append)
+        client.get('/hello')
+        db.set_trace_callback(None)
+    return sum('FROM user' in query for query in queries)
+
+
+@pytest.mark.parametrize('snapshot', (False, True))
+def test_user_cache(app: Flask, client: FlaskClient, auth: AuthActions, snapshot: bool):
+    """
+    1. Depois do login, verifica se as requisições não consultam a tabela user
+    2. Altera o username e verifica se a próxima requisição já vê a alteração
+    3. Verifica se o logout tem efeito imediato
+    """
+
+    with app.app_context():
+        get_user_cache().snapshot = snapshot
+
+    auth.login()
+    client.get('/hello')
+    assert _user_queries(app, client) == 0
+
+    with app.app_context():
+        db = get_db()
+        db.execute("UPDATE user SET username = 'z' WHERE id = 1")
+        db.commit()
+        invalidate_user(1)
+
+    with client:
+        client.get('/')
+        assert g.user.username == 'z'
+
+    auth.logout()
+    with client:
+        client.get('/')
+        assert g.user is None
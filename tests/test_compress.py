@@ -0,0 +1,54 @@
+import gzip
+import zlib
+from flask import Flask, Response
+from flask.testing import FlaskClient
+
+
+def test_compress_index(client: FlaskClient):
+    """
+    1. Verifica se o feed é comprimido com gzip e se o ETag passa a ser fraco
+    2. Verifica se o ETag fraco continua validando o feed (304)
+    3. Verifica se sem Accept-Encoding a resposta não é comprimida
+    """
+
+    response = client.get('/', headers = {'Accept-Encoding': 'gzip, deflate'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert b'test title' in gzip.decompress(response.data)
+    etag = response.headers['ETag']
+    assert etag.startswith('W/')
+
+    response = client.get('/', headers = {'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert response.status_code == 304
+
+    response = client.get('/')
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_compress_deflate_and_min_size(client: FlaskClient):
+
+    response = client.get('/', headers = {'Accept-Encoding': 'deflate'})
+    assert response.headers['Content-Encoding'] == 'deflate'
+    assert b'test title' in zlib.decompress(response.data)
+
+    response = client.get('/hello', headers = {'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.data == b'Hello, world!'
+
+
+def test_compress_stream(app: Flask, client: FlaskClient):
+    """Verifica se respostas geradas sob demanda são comprimidas e se text/event-stream é ignorado."""
+
+    def generate():
+        for i in range(3):
+            yield f'parte {i}\n'
+
+    app.add_url_rule('/stream', 'stream', lambda: Response(generate(), mimetype = 'text/plain'))
+    app.add_url_rule('/sse', 'sse', lambda: Response(generate(), mimetype = 'text/event-stream'))
+
+    response = client.get('/stream', headers = {'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.data) == b'parte 0\nparte 1\nparte 2\n'
+
+    response = client.get('/sse', headers = {'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
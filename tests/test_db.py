@@ -1,21 +1,73 @@
 import sqlite3
+import threading
 import pytest
-from blog.db import get_db
+from blog.db import get_db, get_pool, connect, ConnectionPool
+from blog.exceptions import PoolTimeoutError, NPlusOneError
+from blog.models import User
 from flask import Flask
+from flask.testing import FlaskClient
 
 
 def test_get_close_db(app: Flask):
+    """
+    1. Verifica se a conexão é a mesma durante o contexto
+    2. Verifica se, no contexto seguinte, a mesma conexão é reutilizada
+    3. Verifica se a conexão é fechada ao fechar o pool
+    """
 
     with app.app_context():
         db = get_db()
         assert db is get_db()
 
+    with app.app_context():
+        assert get_db() is db
+
+    with app.app_context():
+        get_pool().close()
     with pytest.raises(sqlite3.ProgrammingError) as e:
         db.execute('SELECT 1')
 
     assert 'closed' in str(e.value)
 
 
+def test_close_db_rollback(app: Flask):
+    """Verifica se uma transação não confirmada é desfeita quando a conexão volta ao pool."""
+
+    with app.app_context():
+        get_db().execute('DELETE FROM post')
+
+    with app.app_context():
+        assert get_db().execute('SELECT COUNT(*) FROM post').fetchone()[0] == 6
+
+
+def test_pool(app: Flask):
+    """
+    1. Cria um pool com uma única conexão
+    2. Verifica se 'acquire' lança PoolTimeoutError enquanto a conexão está em uso
+    3. Devolve a conexão a partir de outra thread e verifica se a espera foi registrada
+    4. Verifica se uma conexão ociosa por mais tempo que 'idle_timeout' é substituída
+    """
+
+    path = app.config['DATABASE']
+    pool = ConnectionPool(lambda: connect(path), max_size = 1, timeout = 0.05)
+
+    with app.app_context():
+        db = pool.acquire()
+        with pytest.raises(PoolTimeoutError):
+            pool.acquire()
+
+        pool.timeout = 5
+        threading.Timer(0.05, pool.release, (db,)).start()
+        assert pool.acquire() is db
+        stats = pool.stats()
+        assert stats['waits'] == 1 and stats['timeouts'] == 1 and stats['wait_time'] > 0
+
+        pool.release(db)
+        pool.idle_timeout = 0
+        assert pool.acquire() is not db
+        assert pool.stats()['created'] == 2
+
+
 def test_init_db_command(runner, monkeypatch):
     
     class Recorder(object):
@@ -27,4 +79,133 @@ def test_init_db_command(runner, monkeypatch):
     monkeypatch.setattr('blog.db.init_db', fake_init_db)
     result = runner.invoke(args = ['init-db'])
     assert 'inicializado' in result.output
-    assert Recorder.called
\ No newline at end of file
+    assert Recorder.called
+
+def test_db_settings_command(runner):
+    result = runner.invoke(args = ['db-settings'])
+    assert 'journal_mode = wal' in result.output
+    assert 'busy_timeout = 5000' in result.output
+
+
+def test_run_maintenance(app: Flask):
+    """
+    1. Verifica se o checkpoint não roda antes do intervalo
+    2. Zera o intervalo e verifica se o checkpoint roda
+    """
+
+    with app.app_context():
+        queries = []
+        db = get_db()
+        db.set_trace_callback(queries.append)
+
+        from blog.db import run_maintenance
+        run_maintenance(db)
+        assert queries == []
+
+        app.config['SQLITE_CHECKPOINT_INTERVAL'] = 0
+        run_maintenance(db)
+        assert queries == ['PRAGMA wal_checkpoint(PASSIVE)']
+        db.set_trace_callback(None)
+
+
+def test_transaction(app: Flask):
+    """
+    1. Salva dois usuários dentro de uma transação e verifica se há um único commit
+    2. Lança uma exceção em um bloco aninhado e verifica se apenas ele é desfeito
+    3. Lança uma exceção no bloco externo e verifica se tudo é desfeito
+    """
+
+    from blog.db import transaction
+    from blog.models import User
+
+    def count() -> int:
+        return get_db().execute('SELECT COUNT(*) FROM user').fetchone()[0]
+
+    with app.app_context():
+
+        queries = []
+        get_db().set_trace_callback(queries.append)
+        with transaction():
+            User('x', '1').save()
+            User('y', '1').save()
+        get_db().set_trace_callback(None)
+        assert queries.count('COMMIT') == 1
+        assert count() == 6
+
+        with transaction():
+            User('z', '1').save()
+            with pytest.raises(ValueError):
+                with transaction():
+                    User('w', '1').save()
+                    raise ValueError
+        assert count() == 7
+
+        with pytest.raises(ValueError):
+            with transaction():
+                User('v', '1').save()
+                with transaction():
+                    User('u', '1').save()
+                raise ValueError
+        assert count() == 7
+
+
+def test_migrate(app: Flask, runner):
+    """
+    1. Simula um banco de dados antigo, sem os índices e sem 'schema_version'
+    2. Roda 'flask migrate' e verifica se os índices foram criados sem perder dados
+    3. Verifica se rodar de novo não aplica nada
+    """
+
+    with app.app_context():
+        db = get_db()
+        db.executescript(
+            'DROP TABLE schema_version;'
+            'DROP INDEX idx_reply_post_id;'
+            'DROP INDEX idx_post_user_id;'
+            'DROP INDEX idx_post_created_id;'
+        )
+
+    result = runner.invoke(args = ['migrate'])
+    assert '0001_reply_post_id_index.sql' in result.output
+    assert '0003_post_created_index.sql' in result.output
+
+    with app.app_context():
+        db = get_db()
+        indexes = {row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert {'idx_reply_post_id', 'idx_post_user_id', 'idx_post_created_id'} <= indexes
+        assert db.execute('SELECT COUNT(*) FROM post').fetchone()[0] == 6
+
+        plan = db.execute('EXPLAIN QUERY PLAN SELECT * FROM reply WHERE post_id = 1').fetchall()
+        assert 'idx_reply_post_id' in plan[0]['detail']
+
+    assert 'atualizado' in runner.invoke(args = ['migrate']).output
+
+
+def test_server_timing(client: FlaskClient):
+    """Verifica se o feed informa a quantidade e o tempo dos comandos SQL no cabeçalho Server-Timing."""
+
+    timing = client.get('/').headers['Server-Timing']
+    assert timing.startswith('db;dur=')
+    assert 'queries' in timing
+
+
+def test_n_plus_one(app: Flask, client: FlaskClient, caplog):
+    """
+    1. Cria uma view que busca cada usuário separadamente
+    2. Verifica se o detector lança NPlusOneError com o comando normalizado
+    3. Verifica se, sem SQL_NPLUSONE_RAISE, o detector apenas registra um aviso
+    """
+
+    @app.route('/users')
+    def users():
+        return ', '.join(User.get(username = name).username for name in 'abcd')
+
+    app.config['SQL_NPLUSONE_THRESHOLD'] = 3
+    with pytest.raises(NPlusOneError, match = 'WHERE username = \\?'):
+        client.get('/users')
+
+    app.config['SQL_NPLUSONE_RAISE'] = False
+    with caplog.at_level('INFO'):
+        assert client.get('/users').status_code == 200
+    assert any('N+1' in record.message for record in caplog.records if record.levelname == 'WARNING')
+    assert any('"queries": 4' in record.message for record in caplog.records)
@@ -0,0 +1,104 @@
+import json
+from flask import Flask
+from flask.testing import FlaskClient
+
+from conftest import AuthActions
+from blog.db import get_db
+from blog.events import EventHub, Subscriber, get_hub
+
+
+def test_coalesce():
+    """Verifica se as publicações do mesmo post são combinadas em um único evento."""
+
+    hub = EventHub()
+    subscriber = hub.subscribe()
+    hub.publish(1, likes = 1)
+    hub.publish(1, likes = 2)
+    hub.publish(2, replies = 1)
+    hub.publish(1, replies = 3)
+    hub.dispatch()
+
+    assert subscriber.wait(0) == (1, {1: {'likes': 2, 'replies': 3}, 2: {'replies': 1}})
+    assert subscriber.wait(0) is None
+    hub.close()
+
+
+def test_slow_subscriber():
+    """
+    1. Verifica se um cliente lento recebe apenas o estado mais recente
+    2. Verifica se, passando do limite de posts pendentes, o cliente recebe um 'reset'
+    """
+
+    subscriber = Subscriber(max_pending = 2)
+    subscriber.push(1, {1: {'likes': 1}})
+    subscriber.push(2, {1: {'likes': 5}})
+    assert subscriber.wait(0) == (2, {1: {'likes': 5}})
+
+    subscriber.push(3, {1: {'likes': 1}, 2: {'likes': 1}, 3: {'likes': 1}})
+    assert subscriber.wait(0) == (3, None)
+    assert subscriber.wait(0) is None
+
+
+def test_subscribe_limits_and_history():
+    """
+    1. Verifica o limite de assinantes
+    2. Verifica se um cliente que reconecta recebe os eventos perdidos, ou um 'reset' se saíram do histórico
+    """
+
+    hub = EventHub(max_subscribers = 1, history = 2)
+    first = hub.subscribe()
+    assert hub.subscribe() is None
+    hub.unsubscribe(first)
+
+    for likes in range(3):
+        hub.publish(1, likes = likes)
+        hub.dispatch()
+
+    assert hub.subscribe(last_event_id = 2).wait(0) == (3, {1: {'likes': 2}})
+    hub.max_subscribers = 10
+    assert hub.subscribe(last_event_id = 0).wait(0) == (3, None)
+    hub.close()
+
+
+def test_events_stream(app: Flask, client: FlaskClient, auth: AuthActions):
+    """Abre o stream, dá like e responde um post, e verifica se o stream recebe os dois estados combinados."""
+
+    app.config.update(EVENTS_ENABLED = True, EVENTS_MAX_IDLE = 0.3, EVENTS_HEARTBEAT = 0.1)
+    with app.app_context():
+        get_hub().window = 0.01
+
+    other = app.test_client()
+    response = other.get('/events', buffered = False)
+    assert response.mimetype == 'text/event-stream'
+
+    auth.login()
+    client.post('/like/1')
+    client.post('/reply/1', data = {'body': 'nova resposta'})
+
+    data = response.get_data(as_text = True)
+    events = [json.loads(line[6:]) for line in data.splitlines() if line.startswith('data: ')]
+    merged = {}
+    for event in events:
+        merged.update(event['1'])
+    assert merged == {'likes': 1, 'replies': 2}
+    assert data.startswith('retry: ')
+
+
+def test_events_disabled(app: Flask, client: FlaskClient, auth: AuthActions):
+    """
+    Verifica se, por padrão, o stream não existe, o feed não carrega o script de eventos
+    e uma resposta não consulta a contagem de respostas para publicá-la.
+    """
+
+    queries = []
+    @app.before_request
+    def trace():
+        get_db().set_trace_callback(queries.append)
+
+    assert client.get('/events').status_code == 404
+    assert b'events.js' not in client.get('/').data
+
+    auth.login()
+    queries.clear()
+    client.post('/reply/1', data = {'body': 'resposta'})
+    assert not any('COUNT' in query for query in queries)
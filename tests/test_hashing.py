@@ -0,0 +1,75 @@
+import pytest
+from flask import Flask
+from werkzeug.security import check_password_hash
+
+from conftest import AuthActions
+from blog.db import get_db
+from blog.exceptions import HashingBusyError
+from blog.hashing import PasswordHasher, get_hasher
+
+
+@pytest.mark.parametrize('workers', (0, 1))
+def test_hash_and_verify(workers: int):
+    """Verifica se o hash gerado no pool (ou no próprio processo) usa o método configurado e é verificável."""
+
+    hasher = PasswordHasher('pbkdf2:sha256:1000', workers = workers)
+    try:
+        password_hash = hasher.hash('senha')
+        assert password_hash.startswith('pbkdf2:sha256:1000$')
+        assert hasher.verify(password_hash, 'senha')
+        assert not hasher.verify(password_hash, 'outra')
+        assert not hasher.needs_rehash(password_hash)
+    finally:
+        hasher.close()
+
+
+def test_needs_rehash_prefix(monkeypatch: pytest.MonkeyPatch):
+    """Verifica se o prefixo de um método completo não calcula hash e se um método incompleto é completado pelo werkzeug."""
+
+    hasher = PasswordHasher('scrypt:32768:8:1', workers = 0)
+    monkeypatch.setattr(hasher, '_run', lambda *args: pytest.fail('calculou um hash'))
+    assert not hasher.needs_rehash('scrypt:32768:8:1$salt$hash')
+    assert hasher.needs_rehash('scrypt:16384:8:1$salt$hash')
+
+    monkeypatch.undo()
+    hasher.method = 'pbkdf2:sha256'
+    assert not hasher.needs_rehash(hasher.hash('senha'))
+    assert hasher.needs_rehash('pbkdf2:sha256:1000$salt$hash')
+
+
+def test_queue_timeout():
+    """Verifica se, sem vagas livres, o hash lança HashingBusyError depois do tempo limite."""
+
+    hasher = PasswordHasher(workers = 0, max_concurrency = 1, queue_timeout = 0.01)
+    hasher._slots.acquire()
+    with pytest.raises(HashingBusyError):
+        hasher.hash('senha')
+
+
+def test_rehash_on_login(app: Flask, auth: AuthActions):
+    """
+    1. Altera o método configurado e faz login com uma senha gerada pelo método antigo
+    2. Verifica se o hash foi atualizado e se a senha continua válida
+    """
+
+    with app.app_context():
+        get_hasher().method = 'pbkdf2:sha256:1000'
+
+    assert auth.login().headers['Location'] == '/'
+
+    with app.app_context():
+        password_hash = get_db().execute('SELECT password FROM user WHERE id = 1').fetchone()[0]
+        assert password_hash.startswith('pbkdf2:sha256:1000$')
+        assert check_password_hash(password_hash, 'a')
+
+
+def test_login_busy(app: Flask, auth: AuthActions):
+    """Verifica se o login responde 503 quando o serviço de hash está ocupado."""
+
+    with app.app_context():
+        hasher = get_hasher()
+        hasher.queue_timeout = 0.01
+        hasher._slots = type(hasher._slots)(1)
+        hasher._slots.acquire()
+
+    assert auth.login().status_code == 503
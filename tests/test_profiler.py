@@ -0,0 +1,66 @@
+import os
+from flask import Flask
+from flask.testing import FlaskCliRunner
+
+from blog import create_app
+from blog.profiler import list_profiles
+
+
+def profiled_app(app: Flask, tmp_path, **config) -> Flask:
+    """Cria um app com o mesmo banco de dados do fixture e o profiler configurado."""
+
+    return create_app({
+        'TESTING': True,
+        'DATABASE': app.config['DATABASE'],
+        'PROFILER_DIR': str(tmp_path / 'profiles'),
+        **config
+    })
+
+
+def test_profile_token(app: Flask, tmp_path):
+    """
+    1. Verifica se apenas as requisições com o token correto são medidas
+    2. Verifica se o perfil e o resumo em texto são gravados com o endpoint no nome
+    """
+
+    app = profiled_app(app, tmp_path, PROFILER_TOKEN = 'segredo')
+    client = app.test_client()
+    client.get('/')
+    client.get('/', headers = {'X-Profile-Token': 'errado'})
+    assert list_profiles(app.config['PROFILER_DIR']) == []
+
+    client.get('/', headers = {'X-Profile-Token': 'segredo'})
+    [path] = list_profiles(app.config['PROFILER_DIR'])
+    assert 'GET-blog.index' in os.path.basename(path)
+    with open(path[:-5] + '.txt', encoding = 'utf8') as f:
+        assert 'cumulative' in f.read()
+
+
+def test_profile_rotation_and_cli(app: Flask, tmp_path):
+    """
+    1. Mede todas as requisições e verifica se apenas os perfis mais recentes são mantidos
+    2. Verifica os comandos 'list', 'aggregate' e 'diff'
+    """
+
+    app = profiled_app(app, tmp_path, PROFILER_ENABLED = True, PROFILER_MAX_FILES = 3)
+    client = app.test_client()
+    for _ in range(4):
+        client.get('/hello')
+    client.get('/')
+    paths = list_profiles(app.config['PROFILER_DIR'])
+    assert len(paths) == 3
+    assert len(os.listdir(app.config['PROFILER_DIR'])) == 6
+
+    runner: FlaskCliRunner = app.test_cli_runner()
+    result = runner.invoke(args = ['profiles', 'list', 'hello'])
+    assert len(result.output.splitlines()) == 2
+
+    result = runner.invoke(args = ['profiles', 'aggregate', 'hello', '--top', '5'])
+    assert result.output.startswith('2 perfis')
+
+    result = runner.invoke(args = ['profiles', 'diff', 'hello', 'blog.index', '--top', '5'])
+    assert result.exit_code == 0
+    assert len(result.output.splitlines()) == 5
+
+    result = runner.invoke(args = ['profiles', 'list', 'nada'])
+    assert result.exit_code != 0
@@ -0,0 +1,51 @@
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient
+
+from conftest import AuthActions
+from blog.ratelimit import MemoryStore, SQLiteStore, get_limiter
+
+
+@pytest.mark.parametrize('store_type', ('memory', 'sqlite'))
+def test_token_bucket(tmp_path, store_type: str):
+    """
+    1. Consome as 2 fichas do balde e verifica se a terceira requisição é recusada
+    2. Verifica se o balde é reabastecido com o tempo
+    """
+
+    if store_type == 'memory':
+        store = MemoryStore()
+    else:
+        store = SQLiteStore(str(tmp_path / 'ratelimit.sqlite'))
+
+    assert store.hit('a', 2, 1, 100) == 0
+    assert store.hit('a', 2, 1, 100) == 0
+    assert store.hit('a', 2, 1, 100) == pytest.approx(1)
+    assert store.hit('b', 2, 1, 100) == 0
+    assert store.hit('a', 2, 1, 101) == 0
+
+
+def test_memory_store_eviction():
+    """Verifica se a chave menos usada é descartada quando o limite de chaves é atingido."""
+
+    store = MemoryStore(max_size = 2)
+    for key in 'abc':
+        store.hit(key, 1, 1, 0)
+    assert list(store._buckets) == ['b', 'c']
+
+
+def test_login_rate_limited(app: Flask, client: FlaskClient, auth: AuthActions):
+    """
+    1. Esgota o limite de logins e verifica a resposta 429 com Retry-After
+    2. Verifica se o GET da página de login não é limitado
+    """
+
+    with app.app_context():
+        get_limiter().rules['auth.login'] = {'limit': 2, 'period': 60, 'key': 'ip', 'methods': ('POST',)}
+
+    auth.login('a', 'errada')
+    auth.login('a', 'errada')
+    response = auth.login()
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) > 0
+    assert client.get('/auth/login').status_code == 200